@@ -2,18 +2,28 @@ import streamlit as st
 import uuid
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, date
 import math
 import json
+import orjson
 import os
-from functools import lru_cache
+import importlib.util
+import zipfile
+from functools import lru_cache, partial
 from typing import Dict, List, Any, Optional
 import base64
 from io import BytesIO
 from PIL import Image
 import matplotlib.pyplot as plt
+
+# 启用写时复制：派生数据框在被修改前共享内存（pandas 3.0 起已默认启用，此选项已弃用）
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
 # 创建费用分类JSON文件
 def initialize_cost_categories():
     """初始化费用分类结构"""
@@ -54,28 +64,261 @@ else:
     with open('cost_categories.json', 'r', encoding='utf-8') as f:
         cost_categories = json.load(f)
 
+# 各业务线默认物料支出比例
+DEFAULT_MATERIAL_RATIOS = {'光谱设备/服务': 0.30, '配液设备': 0.35, '自动化项目': 0.40}
+
+# 时间衰减曲线（λ=0.0315，0-24个月），图表每次重建时直接复用
+DECAY_CURVE_MONTHS = np.arange(0, 25)
+DECAY_CURVE_VALUES = np.exp(-0.0315 * DECAY_CURVE_MONTHS)
+
+# 衰减散点图最多发送到浏览器的点数，超出时随机抽样
+DECAY_SCATTER_MAX_POINTS = 2000
+
+# 收入数据中按category存储的列
+INCOME_CATEGORY_COLUMNS = ['业务线', '交付月份']
+
+# 全面预算汇总可选月份（2025-01 至 2029-12），模块加载时由PeriodIndex一次生成
+BUDGET_MONTH_OPTIONS = pd.period_range('2025-01', '2029-12', freq='M').strftime('%Y-%m').tolist()
+
+# 收入项目编辑器的显示列与列配置（固定不变，模块加载时构建一次）
+INCOME_EDITOR_COLUMNS = [
+    'ID', '项目名称', '交付月份', '合同金额', '保守成单率',
+    '时间衰减因子', '调整后成单率', '预期收入', '纠偏后收入',
+    '首付款比例', '次付款比例', '质保金比例', '业务线'
+]
+INCOME_EDITOR_COLUMN_CONFIG = {
+    "ID": None,  # 隐藏 ID 列
+    "项目名称": st.column_config.TextColumn("项目名称", width="medium"),
+    "交付月份": st.column_config.TextColumn("交付月份", width="small"),
+    "合同金额": st.column_config.NumberColumn("合同金额", format="%.2f", width="small"),
+    "保守成单率": st.column_config.TextColumn("保守成单率", width="small"),
+    "时间衰减因子": st.column_config.NumberColumn("时间衰减因子", format="%.4f", width="small"),
+    "调整后成单率": st.column_config.TextColumn("调整后成单率", width="small"),
+    "预期收入": st.column_config.NumberColumn("预期收入", format="%.2f", width="small"),
+    "纠偏后收入": st.column_config.NumberColumn(
+        "纠偏后收入", 
+        help="直接输入调整后的收入金额", 
+        min_value=0.0, 
+        step=0.01,
+        format="%.2f",
+        width="small"
+    ),
+    "首付款比例": st.column_config.NumberColumn(
+        "首付款比例(%)", 
+        help="首付款占总收入的百分比", 
+        min_value=0, 
+        max_value=100, 
+        step=1,
+        width="small"
+    ),
+    "次付款比例": st.column_config.NumberColumn(
+        "次付款比例(%)", 
+        help="次付款占总收入的百分比", 
+        min_value=0, 
+        max_value=100, 
+        step=1,
+        width="small"
+    ),
+    "质保金比例": st.column_config.NumberColumn(
+        "质保金比例(%)", 
+        help="质保金占总收入的百分比", 
+        min_value=0, 
+        max_value=100, 
+        step=1,
+        width="small"
+    ),
+    "业务线": st.column_config.TextColumn("业务线", width="small"),
+    "删除": st.column_config.CheckboxColumn("删除", help="勾选后立即删除", width="small")
+}
+
+# 页面全局样式（模块级常量，重跑脚本时不再重新构建）
+APP_STYLE = """
+<style>
+    body { background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%); font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; }
+    .main { background: rgba(255, 255, 255, 0.95); border-radius: 15px; padding: 20px; box-shadow: 0 10px 30px rgba(0, 0, 0, 0.1); }
+    .sidebar .sidebar-content { background: linear-gradient(135deg, #1a2a6c 0%, #2a5298 100%); color: white; }
+    .stButton>button { color: #ffffff; background: linear-gradient(135deg, #1a2a6c 0%, #2a5298 100%); border-radius: 8px; border: none; padding: 10px 20px; font-weight: bold; transition: all 0.3s ease; }
+    .stButton>button:hover { transform: translateY(-2px); box-shadow: 0 5px 15px rgba(0, 0, 0, 0.2); }
+    .stMetric { background: white; padding: 15px; border-radius: 10px; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08); border-left: 4px solid #1a2a6c; }
+    .stSelectbox>div>div, .stNumberInput>div>div, .stTextInput>div>div { border-radius: 8px; border: 1px solid #ddd; }
+    .stDownloadButton>button { background: linear-gradient(135deg, #2a9d8f 0%, #264653 100%); color: white; border-radius: 8px; border: none; padding: 10px 20px; font-weight: bold; }
+    .stTabs>div>div { border-bottom: 2px solid #e0e0e0; }
+    .stTabs>div>div>button { font-size: 16px; font-weight: 500; padding: 12px 20px; border-radius: 8px 8px 0 0; }
+    .stTabs>div>div>button[aria-selected="true"] { background: linear-gradient(135deg, #1a2a6c 0%, #2a5298 100%); color: white; border: 1px solid #1a2a6c; }
+    .stExpander { border-radius: 10px; border: 1px solid #e0e0e0; }
+    .stExpander>summary { background: #f8f9fa; padding: 10px; border-radius: 10px 10px 0 0; font-weight: bold; }
+    h1, h2, h3 { color: #1a2a6c; }
+    .css-1aumxhk { background: linear-gradient(135deg, #1a2a6c 0%, #2a5298 100%) !important; }
+    .stDataFrame { border: 1px solid #e0e0e0; border-radius: 8px; overflow: hidden; }
+    .stDataFrame>div>table { border-collapse: collapse; }
+    .stDataFrame>div>table th { background: linear-gradient(135deg, #1a2a6c 0%, #2a5298 100%); color: white; font-weight: bold; }
+    .stDataFrame>div>table td { border: 1px solid #e0e0e0; }
+</style>
+"""
+
+# 页脚（模块级常量，重跑脚本时不再重新构建）
+APP_FOOTER_HTML = "<div style='text-align: center; color: #666666; padding: 20px;'>全面预算管理系统 © 2025 | 咸数科技 · 财务小王 | 当前版本: 3.5</div>"
+
+# 月度毛利率趋势图的公共布局（可视化图表与全面预算汇总页共用）
+MARGIN_TREND_LAYOUT = dict(
+    title='月度毛利率趋势', xaxis_title='月份', yaxis_title='毛利率 (%)', yaxis_range=[-100, 100],
+    plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)'
+)
+
+# 模型说明文档（模块级常量，已去除缩进，重跑脚本时不再重新构建和处理）
+MODEL_DOC_MARKDOWN = """
+### 双重风险预测模型
+
+**核心公式**: `纠偏后收入 = 直接输入（无需计算系数）`
+
+#### 1. 保守成单率
+- 取销售提供概率区间的下限值（如50%-80%取50%）
+- 体现研发思维中的保守原则
+
+#### 2. 时间衰减因子
+- 采用指数衰减模型: `e^(-λt)`
+- `λ` = 衰减系数（行业基准0.0315）
+- `t` = 项目交付月份与当前月份的差值（月）
+- **理论依据**：风险随时间呈非线性累积，符合复杂系统不确定性增长规律
+
+#### 3. 手动纠偏
+- 直接输入最终的纠偏后收入金额
+- 无需计算系数，简化操作流程
+- **应用场景**：对确定性极高的项目（如已签约）直接调整金额，对风险较大的项目进行下调
+
+### 现金流计算逻辑
+- **首付款**：交付当月支付（默认50%，可调整）
+- **次付款**：交付次月支付（默认40%，可调整）
+- **质保金**：交付一年后支付（默认10%，可调整）
+- **现金流预测**：基于纠偏后收入和个性化付款比例计算
+
+### 付款比例管理
+- 每个项目可设置独立的付款比例
+- 默认比例：50% + 40% + 10% = 100%
+- 系统自动验证比例总和为100%
+- 支持在项目列表中批量调整
+
+### 物料支出计算逻辑
+- **光谱设备/服务**：默认30%，可手动调整
+- **配液设备**：默认35%，可手动调整
+- **自动化项目**：默认40%，可手动调整
+- **支出时间**：交付月份的前一个月
+- **支出金额**：纠偏后收入 × 物料支出比例
+
+### 人工成本管理
+- **成本类型**：销售费用、制造费用、研发费用、管理费用等
+- **人员/部门**：具体的人力资源分配
+- **月度成本**：每月的人工成本
+- **时间范围**：成本生效的时间段
+- **自动计算**：按天数比例分配跨月成本
+
+### 行政费用管理
+- **费用类型**：房租、水电、办公用品、差旅等
+- **费用项目**：具体的费用项目
+- **付款频率**：月度、季度、年度
+- **时间范围**：费用生效的时间段
+
+### 偶然收支管理
+- **偶然收入**：政府补贴、投资收益、一次性收入等
+- **偶然支出**：罚款、维修、捐赠等一次性支出
+- **核算方式**：计入月度现金流，影响Runway分析
+
+### Runway分析
+- **现金余额**：在系统配置中设置当前现金余额
+- **净现金流**：月度收入 - 月度支出
+- **Runway计算**：累计现金余额首次为负的月份
+- **趋势图**：显示现金余额随时间的变化趋势
+"""
+
+def compute_project_metrics(contract_amount, close_rate, month_diff):
+    """计算时间衰减因子、调整后成单率(%)和预期收入，标量与数组/Series输入均可"""
+    time_decay = np.exp(-0.0315 * month_diff)
+    return time_decay, close_rate * time_decay, contract_amount * (close_rate / 100) * time_decay
+
+def shift_months(dates: np.ndarray, months: int) -> np.ndarray:
+    """按月平移datetime64数组，日期超出目标月天数时对齐到月末（与pd.DateOffset(months=n)一致）"""
+    one_day = np.timedelta64(1, 'D')
+    source_months = dates.astype('datetime64[M]')
+    offset_in_month = dates - source_months.astype(dates.dtype)
+    target_months = source_months + months
+    target_month_end = (target_months + 1).astype(dates.dtype) - one_day + offset_in_month % one_day
+    return np.minimum(target_months.astype(dates.dtype) + offset_in_month, target_month_end)
+
+def expand_labor_months(start_dates: np.ndarray, end_dates: np.ndarray,
+                        monthly_cost: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """将人工成本展开为逐月金额（纯数组计算，不依赖DataFrame）
+
+    每行从开始月份1日起覆盖至结束日期所在月份，跨月部分按天数比例分配。
+    返回 (原始行号, 支出月份datetime64[M], 当月金额)。
+    """
+    start_months = start_dates.astype('datetime64[M]')
+    end_months = end_dates.astype('datetime64[M]')
+    month_counts = np.clip((end_months - start_months).astype(np.int64) + 1, 0, None)
+    row_idx = np.repeat(np.arange(len(start_dates)), month_counts)
+    month_offsets = np.arange(len(row_idx)) - np.repeat(np.cumsum(month_counts) - month_counts, month_counts)
+    months = start_months[row_idx] + month_offsets
+
+    month_start = months.astype('datetime64[D]')
+    next_month_start = (months + 1).astype('datetime64[D]')
+    actual_end = np.minimum(next_month_start - 1, end_dates[row_idx].astype('datetime64[D]'))
+    days_for_cost = (actual_end - month_start).astype(np.int64) + 1
+    days_in_month = (next_month_start - month_start).astype(np.int64)
+    return row_idx, months, monthly_cost[row_idx] * (days_for_cost / days_in_month)
+
+
 class DataManager:
     """数据管理类，负责数据的加载、保存和兼容性处理"""
-    
+
+    @staticmethod
+    def _format_date_value(value: Any) -> Any:
+        """将date/datetime对象格式化为日期字符串，其他值保持不变"""
+        return value.strftime('%Y-%m-%d') if isinstance(value, (datetime, date)) else value
+
+    @staticmethod
+    def _frame_save_key(df: pd.DataFrame) -> tuple:
+        """数据框的保存指纹：列名加逐行哈希字节（不含索引，与写出的记录一致），行顺序变化也会改变指纹"""
+        return (tuple(df.columns), pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+
+    @staticmethod
+    def _is_saved_unchanged(filename: str, saved_key: tuple) -> bool:
+        """文件修改时间与本会话上次写入时一致（未被其他会话改写）且内容指纹相同时返回True"""
+        saved = st.session_state.get('_saved_file_hashes', {}).get(filename)
+        return saved is not None and os.path.exists(filename) and saved == (os.stat(filename).st_mtime_ns, saved_key)
+
+    @staticmethod
+    def _record_saved(filename: str, saved_key: tuple) -> None:
+        """记录本次写入后的文件修改时间与内容指纹"""
+        st.session_state.setdefault('_saved_file_hashes', {})[filename] = (os.stat(filename).st_mtime_ns, saved_key)
+
     @staticmethod
     def save_data_to_json(data: Any, filename: str) -> bool:
-        """保存数据到JSON文件"""
+        """保存数据到JSON文件，数据框内容与上次保存一致且文件未被改写时跳过写入"""
         try:
+            saved_key = None
             if isinstance(data, pd.DataFrame):
+                saved_key = DataManager._frame_save_key(data)
+                if DataManager._is_saved_unchanged(filename, saved_key):
+                    return True
                 df_copy = data.copy()
                 for col in df_copy.columns:
                     if pd.api.types.is_datetime64_any_dtype(df_copy[col]):
                         df_copy[col] = df_copy[col].dt.strftime('%Y-%m-%d')
                     elif df_copy[col].dtype == 'object':  # 检查object类型列，可能包含date对象
-                        # 检查是否包含date/datetime对象
-                        for i, val in enumerate(df_copy[col]):
-                            if isinstance(val, (datetime, date)):
-                                df_copy.iat[i, df_copy.columns.get_loc(col)] = val.strftime('%Y-%m-%d')
+                        # 纯字符串/数值列无需逐个检查
+                        if pd.api.types.infer_dtype(df_copy[col], skipna=True) not in ('string', 'integer', 'floating', 'boolean', 'empty'):
+                            df_copy[col] = df_copy[col].map(DataManager._format_date_value)
                 json_data = df_copy.to_dict('records')
             else:
                 json_data = data
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, ensure_ascii=False, indent=2)
+            # 先写临时文件再替换，避免写入中断时留下不完整的JSON
+            tmp_filename = f"{filename}.tmp"
+            # orjson直接输出UTF-8字节，格式与原json.dump(ensure_ascii=False, indent=2)一致；NaN写为null
+            payload = orjson.dumps(json_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+            with open(tmp_filename, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_filename, filename)
+            if saved_key is not None:
+                DataManager._record_saved(filename, saved_key)
             return True
         except Exception as e:
             st.error(f"保存JSON文件失败: {str(e)}")
@@ -86,8 +329,14 @@ class DataManager:
         """从JSON文件加载数据"""
         try:
             if os.path.exists(filename):
-                with open(filename, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
+                with open(filename, 'rb') as f:
+                    raw_content = f.read()
+                try:
+                    # 标准JSON直接用orjson解析字节内容
+                    json_data = orjson.loads(raw_content)
+                except orjson.JSONDecodeError:
+                    # 空文件、NaN值或多余逗号等情况回退到容错解析
+                    content = raw_content.decode('utf-8').strip()
                     if not content:  # 检查文件是否为空
                         st.info(f"文件 {filename} 为空，返回空DataFrame")
                         return pd.DataFrame()
@@ -104,16 +353,9 @@ class DataManager:
                     
                 if json_data:
                     df = pd.DataFrame(json_data)
-                    # 只转换已知的日期列，避免将其他object类型误转换
-                    for col in ['交付日期', '开始日期', '结束日期', '收入日期', '支出日期']:
-                        if col in df.columns:
-                            # 先尝试转换为datetime，如果失败则跳过
-                            try:
-                                df[col] = pd.to_datetime(df[col], errors='coerce')
-                            except:
-                                # 如果转换失败，保持原值
-                                pass
-                    return df
+                    # 只转换已知的日期列，避免将其他object类型误转换；无法解析的值记为NaT
+                    df = DataManager.ensure_datetime_columns(df, ['交付日期', '开始日期', '结束日期', '收入日期', '支出日期'], errors='coerce')
+                    return DataManager.downcast_numeric_columns(df)
             return pd.DataFrame()
         except json.JSONDecodeError as e:
             st.error(f"JSON格式错误: {str(e)}")
@@ -132,6 +374,120 @@ class DataManager:
             st.error(f"加载JSON文件失败: {str(e)}")
             return pd.DataFrame()
 
+    @staticmethod
+    def save_data_to_parquet(df: pd.DataFrame, filename: str) -> bool:
+        """保存数据框到Parquet文件（zstd压缩），内容与上次保存一致且文件未被改写时跳过写入"""
+        try:
+            saved_key = DataManager._frame_save_key(df)
+            if DataManager._is_saved_unchanged(filename, saved_key):
+                return True
+            # 先写临时文件再替换，避免写入中断时留下不完整的文件
+            tmp_filename = f"{filename}.tmp"
+            df.to_parquet(tmp_filename, engine='pyarrow', compression='zstd', index=False)
+            os.replace(tmp_filename, filename)
+            DataManager._record_saved(filename, saved_key)
+            return True
+        except Exception as e:
+            st.error(f"保存Parquet文件失败: {str(e)}")
+            return False
+
+    @staticmethod
+    def load_data_from_parquet(filename: str, legacy_json: Optional[str] = None) -> pd.DataFrame:
+        """从Parquet文件加载数据；Parquet文件不存在而旧JSON文件存在时，读取JSON并一次性迁移为Parquet"""
+        try:
+            if os.path.exists(filename):
+                return DataManager.downcast_numeric_columns(pd.read_parquet(filename, engine='pyarrow'))
+            if legacy_json and os.path.exists(legacy_json):
+                df = DataManager.load_data_from_json(legacy_json)
+                # 解析失败或内容为空时保留旧JSON文件，避免写出空Parquet并丢失原始数据
+                if df.empty:
+                    return df
+                # 迁移写入成功后才删除旧JSON文件
+                if DataManager.save_data_to_parquet(df, filename):
+                    os.remove(legacy_json)
+                return df
+            return pd.DataFrame()
+        except Exception as e:
+            st.error(f"加载Parquet文件失败: {str(e)}")
+            return pd.DataFrame()
+
+    @staticmethod
+    def read_uploaded_table(uploaded_file) -> pd.DataFrame:
+        """读取上传的CSV/Excel文件：CSV用pyarrow多线程解析，Excel在安装python-calamine时用calamine解析"""
+        if uploaded_file.name.endswith('.csv'):
+            # pyarrow把ISO格式日期列解析为datetime.date对象（object列），仍由后续ensure_datetime_columns统一转换为datetime64
+            return pd.read_csv(uploaded_file, engine='pyarrow')
+        if uploaded_file.name.endswith(('.xlsx', '.xls')):
+            if importlib.util.find_spec('python_calamine') is not None:
+                return pd.read_excel(uploaded_file, engine='calamine')
+            return pd.read_excel(uploaded_file)
+        raise ValueError(f"不支持的文件格式: {uploaded_file.name}")
+
+    @staticmethod
+    def append_rows(existing: pd.DataFrame, new_df: pd.DataFrame) -> pd.DataFrame:
+        """追加数据行，空表时直接采用新数据，否则一次拼接到现有数据后"""
+        return new_df if existing.empty else pd.concat([existing, new_df], ignore_index=True)
+
+    @staticmethod
+    def downcast_numeric_columns(df: pd.DataFrame) -> pd.DataFrame:
+        """将整数列压缩为int32以减少内存占用"""
+        # 金额类浮点列保持float64，避免float32精度误差写回JSON；
+        # 比例列不压缩到int8，避免三项比例相加时溢出
+        int32_info = np.iinfo(np.int32)
+        for col in df.select_dtypes(include='int64').columns:
+            if df[col].between(int32_info.min, int32_info.max).all():
+                df[col] = df[col].astype(np.int32)
+        return df
+
+    @staticmethod
+    def categorize_columns(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+        """将低基数的分类列转换为category类型，加快分组汇总"""
+        for col in columns:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        return df
+
+    @staticmethod
+    def ensure_datetime_columns(df: pd.DataFrame, columns: List[str], errors: str = 'raise') -> pd.DataFrame:
+        """将日期列原地转换为datetime类型，已是datetime的列直接跳过"""
+        for col in columns:
+            if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+                try:
+                    # 保存的文件和表单日期均为ISO格式，先按ISO 8601直接解析，不逐个推断格式
+                    df[col] = pd.to_datetime(df[col], format='ISO8601')
+                except (ValueError, TypeError):
+                    df[col] = pd.to_datetime(df[col], errors=errors)
+        return df
+
+    @staticmethod
+    def frame_fingerprint(df: pd.DataFrame) -> int:
+        """按内容计算数据框指纹（逐行向量化哈希后求和）"""
+        return int(pd.util.hash_pandas_object(df, index=True).sum())
+
+    @staticmethod
+    def frames_differ(edited: pd.DataFrame, original: pd.DataFrame) -> bool:
+        """判断编辑器返回的数据是否有修改：先比较形状和列，再比较内容指纹"""
+        if edited.shape != original.shape or not edited.columns.equals(original.columns):
+            return True
+        return DataManager.frame_fingerprint(edited) != DataManager.frame_fingerprint(original)
+
+    @staticmethod
+    def editor_has_changes(editor_key: str, edited: pd.DataFrame, original: pd.DataFrame) -> bool:
+        """根据st.data_editor记录的增量（新增/删除/编辑的行）判断是否有修改，只比较被编辑过的行"""
+        editor_state = st.session_state.get(editor_key) or {}
+        if editor_state.get('added_rows') or editor_state.get('deleted_rows'):
+            return True
+        # 只勾选“删除”列不算编辑，由删除逻辑单独处理
+        edited_positions = sorted(
+            int(pos) for pos, changes in editor_state.get('edited_rows', {}).items()
+            if set(changes) - {'删除'}
+        )
+        if not edited_positions:
+            return False
+        if edited.shape != original.shape:
+            return True
+        return DataManager.frames_differ(edited.iloc[edited_positions], original.iloc[edited_positions])
+
     @staticmethod
     def ensure_columns_compatibility(df: pd.DataFrame) -> pd.DataFrame:
         """确保数据框包含必需的列"""
@@ -139,7 +495,8 @@ class DataManager:
         for col in required_columns:
             if col not in df.columns:
                 df[col] = {'首付款比例': 50, '次付款比例': 40, '质保金比例': 10}[col]
-        return df
+        # 筛选和分组用的低基数列转为category，比较时使用整数编码
+        return DataManager.categorize_columns(df, INCOME_CATEGORY_COLUMNS)
 
 
 class IncomeManager:
@@ -147,23 +504,48 @@ class IncomeManager:
     
     def __init__(self, df: pd.DataFrame = None, material_ratios: Dict = None):
         self.data = df if df is not None else pd.DataFrame()
-        self.material_ratios = material_ratios or {
-            '光谱设备/服务': 0.30, '配液设备': 0.35, '自动化项目': 0.40
-        }
+        self.material_ratios = material_ratios or dict(DEFAULT_MATERIAL_RATIOS)
+
+    @property
+    def data(self) -> pd.DataFrame:
+        return self._data
+
+    @data.setter
+    def data(self, df: pd.DataFrame):
+        # 替换数据时清空缓存
+        self._data = df
+        self._cache = {}
+
+    def add_projects(self, new_df: pd.DataFrame):
+        """追加项目数据，空表时直接采用新数据，否则一次拼接到现有数据后"""
+        combined = DataManager.append_rows(self.data, new_df)
+        # 拼接后category列可能退化为object，重新转换
+        self.data = DataManager.categorize_columns(combined, INCOME_CATEGORY_COLUMNS)
+
+    def _cached(self, name: str, builder) -> pd.DataFrame:
+        """缓存生成结果：通过data属性替换数据时清空缓存，物料比例变化时重新生成"""
+        # 物料比例字典可能被配置页原地修改，比例本身很小，直接作为缓存键
+        key = tuple(sorted(self.material_ratios.items()))
+        cached = self._cache.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, builder())
+            self._cache[name] = cached
+        return cached[1]
 
     def generate_summary(self) -> pd.DataFrame:
         """生成收入摘要数据"""
         if self.data.empty: 
             return pd.DataFrame()
         
-        summary_data = []
-        self.data['交付日期'] = pd.to_datetime(self.data['交付日期'])
+        DataManager.ensure_datetime_columns(self.data, ['交付日期'])
         self.data['交付季度'] = self.data['交付日期'].dt.quarter
         self.data['交付年份'] = self.data['交付日期'].dt.year
         self.data['季度'] = self.data['交付年份'].astype(str) + '-Q' + self.data['交付季度'].astype(str)
-        
+        return self._cached('summary', self._build_summary)
+
+    def _build_summary(self) -> pd.DataFrame:
         # 按季度聚合数据
-        quarterly = self.data.groupby('季度').agg(
+        quarterly = self.data.groupby('季度', sort=False).agg(
             金额=('纠偏后收入', 'sum'),
             项目数=('项目名称', 'count'),
             平均衰减=('时间衰减因子', 'mean'),
@@ -172,29 +554,21 @@ class IncomeManager:
         quarterly = quarterly.sort_values('季度')
         quarterly['累计金额'] = quarterly['金额'].cumsum()
         quarterly['累计占比'] = quarterly['累计金额'] / quarterly['金额'].sum() * 100 if quarterly['金额'].sum() > 0 else 0
-        
-        for _, row in quarterly.iterrows():
-            summary_data.append({
-                '类别': '季度收入', '项目': row['季度'], '金额': round(row['金额'], 2),
-                '项目数': row['项目数'], '平均衰减': round(row['平均衰减'], 4),
-                '累计占比': round(row['累计占比'], 1), '合同总额': round(row['合同总额'], 2)
-            })
+        quarterly_rows = quarterly.rename(columns={'季度': '项目'})[['项目', '金额', '项目数', '平均衰减', '累计占比', '合同总额']]
+        quarterly_rows = quarterly_rows.round({'金额': 2, '平均衰减': 4, '累计占比': 1, '合同总额': 2})
+        quarterly_rows.insert(0, '类别', '季度收入')
         
         # 按业务线聚合数据
-        business = self.data.groupby('业务线').agg(
+        business = self.data.groupby('业务线', observed=True).agg(
             金额=('纠偏后收入', 'sum'),
             项目数=('项目名称', 'count'),
             合同总额=('合同金额', 'sum')
         ).reset_index()
         business['贡献率'] = business['金额'] / business['金额'].sum() * 100 if business['金额'].sum() > 0 else 0
         business = business.sort_values('金额', ascending=False)
-        
-        for _, row in business.iterrows():
-            summary_data.append({
-                '类别': '业务线', '项目': row['业务线'], '金额': round(row['金额'], 2),
-                '项目数': row['项目数'], '贡献率': round(row['贡献率'], 1),
-                '合同总额': round(row['合同总额'], 2)
-            })
+        business_rows = business.rename(columns={'业务线': '项目'})[['项目', '金额', '项目数', '贡献率', '合同总额']]
+        business_rows = business_rows.round({'金额': 2, '贡献率': 1, '合同总额': 2})
+        business_rows.insert(0, '类别', '业务线')
         
         # 计算核心指标
         total_revenue = self.data['预期收入'].sum()
@@ -203,72 +577,81 @@ class IncomeManager:
         avg_decay = self.data['时间衰减因子'].mean() if not self.data.empty else 0
         conversion_rate = total_adjusted_revenue / total_contract * 100 if total_contract > 0 else 0
         
-        summary_data.extend([
-            {'类别': '核心指标', '项目': '总预期收入', '金额': round(total_revenue, 2), '项目数': len(self.data), '贡献率': None, '合同总额': round(total_contract, 2)},
-            {'类别': '核心指标', '项目': '总纠偏后收入', '金额': round(total_adjusted_revenue, 2), '项目数': len(self.data), '贡献率': None, '合同总额': round(total_contract, 2)},
-            {'类别': '核心指标', '项目': '平均时间衰减', '金额': round(avg_decay, 4), '项目数': None, '贡献率': None},
-            {'类别': '核心指标', '项目': '整体转化率', '金额': round(conversion_rate, 1), '项目数': None, '贡献率': None}
-        ])
-        
-        return pd.DataFrame(summary_data)
+        core_rows = pd.DataFrame({
+            '类别': '核心指标',
+            '项目': ['总预期收入', '总纠偏后收入', '平均时间衰减', '整体转化率'],
+            '金额': [round(total_revenue, 2), round(total_adjusted_revenue, 2), round(avg_decay, 4), round(conversion_rate, 1)],
+            '项目数': [len(self.data), len(self.data), None, None],
+            '贡献率': np.nan,
+            '合同总额': [round(total_contract, 2), round(total_contract, 2), None, None]
+        })
+        
+        return pd.concat([quarterly_rows, business_rows, core_rows], ignore_index=True, sort=False)
+
+    def _payment_ratio_percents(self) -> Dict[str, pd.Series]:
+        """获取各项目付款比例（缺失列时使用默认值）"""
+        return {
+            col: self.data[col] if col in self.data.columns else pd.Series(default, index=self.data.index)
+            for col, default in [('首付款比例', 50), ('次付款比例', 40), ('质保金比例', 10)]
+        }
 
     def generate_cash_flow_data(self) -> pd.DataFrame:
         """生成现金流数据"""
-        cash_flow_data = []
-        for _, project in self.data.iterrows():
-            delivery_date = pd.to_datetime(project['交付日期'])
-            first_payment_ratio = project.get('首付款比例', 50) / 100.0
-            second_payment_ratio = project.get('次付款比例', 40) / 100.0
-            final_payment_ratio = project.get('质保金比例', 10) / 100.0
-            total_ratio = first_payment_ratio + second_payment_ratio + final_payment_ratio
-            if abs(total_ratio - 1.0) > 0.001:
-                st.warning(f"项目 {project['项目名称']} 的付款比例总和不是100%，当前总和: {total_ratio*100:.1f}%")
-            
-            # 首付款
-            first_payment_date = delivery_date
-            first_payment_amount = project['纠偏后收入'] * first_payment_ratio
-            cash_flow_data.append({
-                '项目名称': project['项目名称'], '现金流类型': '首付款', '支付日期': first_payment_date,
-                '支付月份': f"{first_payment_date.year}-{first_payment_date.month:02d}", '金额': round(first_payment_amount, 2),
-                '业务线': project['业务线'], '付款比例': f"{project.get('首付款比例', 50)}%"
-            })
-            
-            # 次付款
-            second_payment_date = delivery_date + pd.DateOffset(months=1)
-            second_payment_amount = project['纠偏后收入'] * second_payment_ratio
-            cash_flow_data.append({
-                '项目名称': project['项目名称'], '现金流类型': '次付款', '支付日期': second_payment_date,
-                '支付月份': f"{second_payment_date.year}-{second_payment_date.month:02d}", '金额': round(second_payment_amount, 2),
-                '业务线': project['业务线'], '付款比例': f"{project.get('次付款比例', 40)}%"
-            })
-            
-            # 质保金
-            final_payment_date = delivery_date + pd.DateOffset(years=1)
-            final_payment_amount = project['纠偏后收入'] * final_payment_ratio
-            cash_flow_data.append({
-                '项目名称': project['项目名称'], '现金流类型': '质保金', '支付日期': final_payment_date,
-                '支付月份': f"{final_payment_date.year}-{final_payment_date.month:02d}", '金额': round(final_payment_amount, 2),
-                '业务线': project['业务线'], '付款比例': f"{project.get('质保金比例', 10)}%"
-            })
-        return pd.DataFrame(cash_flow_data)
+        if self.data.empty:
+            return pd.DataFrame()
+
+        total_ratio = sum(p.to_numpy(dtype=float) / 100.0 for p in self._payment_ratio_percents().values())
+        invalid = np.abs(total_ratio - 1.0) > 0.001
+        for name, ratio in zip(self.data['项目名称'].to_numpy()[invalid], total_ratio[invalid]):
+            st.warning(f"项目 {name} 的付款比例总和不是100%，当前总和: {ratio*100:.1f}%")
+        return self._cached('cash_flow', self._build_cash_flow_data)
+
+    def _build_cash_flow_data(self) -> pd.DataFrame:
+        delivery_dates = DataManager.ensure_datetime_columns(self.data, ['交付日期'])['交付日期'].to_numpy()
+        adjusted_revenue = self.data['纠偏后收入'].to_numpy()
+        ratio_percents = self._payment_ratio_percents()
+
+        # 首付款：交付当月；次付款：交付次月；质保金：交付一年后
+        payment_schedule = [
+            ('首付款', '首付款比例', 0),
+            ('次付款', '次付款比例', 1),
+            ('质保金', '质保金比例', 12),
+        ]
+        cash_flow_frames = []
+        for cash_type, ratio_col, month_offset in payment_schedule:
+            percents = ratio_percents[ratio_col]
+            payment_dates = shift_months(delivery_dates, month_offset)
+            cash_flow_frames.append(pd.DataFrame({
+                '项目名称': self.data['项目名称'].to_numpy(), '现金流类型': cash_type, '支付日期': payment_dates,
+                '支付月份': np.datetime_as_string(payment_dates, unit='M'),
+                '金额': np.round(adjusted_revenue * (percents.to_numpy(dtype=float) / 100.0), 2),
+                '业务线': self.data['业务线'].to_numpy(), '付款比例': (percents.astype(str) + '%').to_numpy()
+            }, index=np.arange(len(self.data))))
+        # 按项目交错排列，保持每个项目三笔款项相邻
+        cash_flow_df = pd.concat(cash_flow_frames).sort_index(kind='stable').reset_index(drop=True)
+        return DataManager.categorize_columns(cash_flow_df, ['现金流类型', '业务线'])
 
     def generate_material_cost_data(self) -> pd.DataFrame:
         """生成物料成本数据"""
-        material_cost_data = []
-        for _, project in self.data.iterrows():
-            business_line = project['业务线']
-            material_ratio = self.material_ratios.get(business_line, 
-                {'光谱设备/服务': 0.30, '配液设备': 0.35, '自动化项目': 0.40}.get(business_line, 0.30))
-            material_cost = project['纠偏后收入'] * material_ratio
-            delivery_date = pd.to_datetime(project['交付日期'])
-            material_payment_date = delivery_date - pd.DateOffset(months=1)
-            material_cost_data.append({
-                '项目名称': project['项目名称'], '业务线': project['业务线'],
-                '物料支出比例': material_ratio * 100, '物料成本': round(material_cost, 2),
-                '支出月份': f"{material_payment_date.year}-{material_payment_date.month:02d}",
-                '支出日期': material_payment_date
-            })
-        return pd.DataFrame(material_cost_data)
+        return self._cached('material_cost', self._build_material_cost_data)
+
+    def _build_material_cost_data(self) -> pd.DataFrame:
+        if self.data.empty:
+            return pd.DataFrame()
+
+        # 业务线物料比例：优先使用配置值，其次默认值，未知业务线按30%计算
+        material_ratio = self.data['业务线'].map({**DEFAULT_MATERIAL_RATIOS, **self.material_ratios}).fillna(0.30).to_numpy(dtype=float)
+        # 物料在交付月份的前一个月支出
+        delivery_dates = DataManager.ensure_datetime_columns(self.data, ['交付日期'])['交付日期'].to_numpy()
+        material_payment_dates = shift_months(delivery_dates, -1)
+        material_df = pd.DataFrame({
+            '项目名称': self.data['项目名称'].to_numpy(), '业务线': self.data['业务线'].to_numpy(),
+            '物料支出比例': material_ratio * 100,
+            '物料成本': np.round(self.data['纠偏后收入'].to_numpy() * material_ratio, 2),
+            '支出月份': np.datetime_as_string(material_payment_dates, unit='M'),
+            '支出日期': material_payment_dates
+        })
+        return DataManager.categorize_columns(material_df, ['业务线'])
 
 
 class CostManager:
@@ -277,102 +660,89 @@ class CostManager:
     def __init__(self, df: pd.DataFrame = None):
         self.data = df if df is not None else pd.DataFrame()
 
+    @property
+    def data(self) -> pd.DataFrame:
+        return self._data
+
+    @data.setter
+    def data(self, df: pd.DataFrame):
+        # 替换数据时清空缓存
+        self._data = df
+        self._cache = None
+
+    def add_rows(self, new_df: pd.DataFrame):
+        """追加成本数据，空表时直接采用新数据，否则一次拼接到现有数据后"""
+        self.data = DataManager.append_rows(self.data, new_df)
+
     def generate_cost_data(self) -> pd.DataFrame:
+        """生成月度成本数据，缓存结果直到通过data属性替换数据"""
+        if self.data.empty: 
+            return pd.DataFrame()
+        
+        DataManager.ensure_datetime_columns(self.data, ['开始日期', '结束日期'])
+        if self._cache is None:
+            self._cache = self._build_cost_data()
+        return self._cache
+
+    def _build_cost_data(self) -> pd.DataFrame:
         """生成成本数据 - 子类需实现"""
-        raise NotImplementedError("子类必须实现generate_cost_data方法")
+        raise NotImplementedError("子类必须实现_build_cost_data方法")
 
 
 class LaborCostManager(CostManager):
     """人工成本管理类"""
     
-    def generate_cost_data(self) -> pd.DataFrame:
+    def _build_cost_data(self) -> pd.DataFrame:
         """生成人工成本数据"""
-        if self.data.empty: 
-            return pd.DataFrame()
-        
-        labor_data = self.data.copy()
-        labor_data['开始日期'] = pd.to_datetime(labor_data['开始日期'])
-        labor_data['结束日期'] = pd.to_datetime(labor_data['结束日期'])
-        monthly_costs = []
-        for _, row in labor_data.iterrows():
-            start_date = row['开始日期']
-            end_date = row['结束日期']
-            current_date = start_date.replace(day=1)
-            while current_date <= end_date:
-                month_end = current_date + pd.DateOffset(months=1) - pd.DateOffset(days=1)
-                if month_end > end_date: 
-                    month_end = end_date
-                days_in_month = (current_date + pd.DateOffset(months=1) - current_date).days
-                actual_end = min(month_end, end_date)
-                days_for_cost = (actual_end - current_date).days + 1
-                monthly_amount = row['月度成本'] * (days_for_cost / days_in_month)
-                monthly_costs.append({
-                    '成本类型': row['成本类型'], '人员/部门': row['人员/部门'],
-                    '成本金额': round(monthly_amount, 2),
-                    '支出月份': f"{current_date.year}-{current_date.month:02d}",
-                    '开始日期': row['开始日期'], '结束日期': row['结束日期']
-                })
-                current_date = current_date + pd.DateOffset(months=1)
-        return pd.DataFrame(monthly_costs)
+        labor_data = self.data
+
+        row_idx, months, monthly_amount = expand_labor_months(
+            labor_data['开始日期'].to_numpy(), labor_data['结束日期'].to_numpy(), labor_data['月度成本'].to_numpy()
+        )
+
+        expanded = labor_data.iloc[row_idx]
+        labor_monthly = pd.DataFrame({
+            '成本类型': expanded['成本类型'].to_numpy(), '人员/部门': expanded['人员/部门'].to_numpy(),
+            '成本金额': np.round(monthly_amount, 2),
+            '支出月份': np.datetime_as_string(months, unit='M'),
+            '开始日期': expanded['开始日期'].to_numpy(), '结束日期': expanded['结束日期'].to_numpy()
+        })
+        return DataManager.categorize_columns(labor_monthly, ['成本类型'])
 
 
 class AdminCostManager(CostManager):
     """行政费用管理类"""
     
-    def generate_cost_data(self) -> pd.DataFrame:
+    def _build_cost_data(self) -> pd.DataFrame:
         """生成行政费用数据"""
-        if self.data.empty: 
-            return pd.DataFrame()
-        
-        admin_cost_data = []
-        for _, row in self.data.iterrows():
-            secondary_category = row['费用类型']  # 二级分类
-            monthly_cost = row['月度成本']
-            start_date = pd.to_datetime(row['开始日期'])
-            end_date = pd.to_datetime(row['结束日期'])
-            payment_frequency = row['付款频率']
-            
-            # 获取一级分类
-            primary_category = self.get_primary_category(secondary_category)
-            
-            if payment_frequency == '月度':
-                current_date = start_date.replace(day=1)
-                while current_date <= end_date:
-                    admin_cost_data.append({
-                        '一级分类': primary_category,
-                        '费用类型': secondary_category,  # 二级分类
-                        '费用项目': row['费用项目'],
-                        '月度成本': round(monthly_cost, 2),
-                        '支出月份': f"{current_date.year}-{current_date.month:02d}",
-                        '支出日期': current_date, 
-                        '付款频率': payment_frequency
-                    })
-                    current_date = current_date + pd.DateOffset(months=1)
-            elif payment_frequency == '季度':
-                current_date = start_date.replace(day=1)
-                while current_date <= end_date:
-                    admin_cost_data.append({
-                        '一级分类': primary_category,
-                        '费用类型': secondary_category,  # 二级分类
-                        '费用项目': row['费用项目'],
-                        '月度成本': round(monthly_cost * 3, 2),
-                        '支出月份': f"{current_date.year}-{current_date.month:02d}",
-                        '支出日期': current_date, 
-                        '付款频率': payment_frequency
-                    })
-                    current_date = current_date + pd.DateOffset(months=3)
-            elif payment_frequency == '年度':
-                current_date = start_date.replace(day=1)
-                admin_cost_data.append({
-                    '一级分类': primary_category,
-                    '费用类型': secondary_category,  # 二级分类
-                    '费用项目': row['费用项目'],
-                    '月度成本': round(monthly_cost * 12, 2),
-                    '支出月份': f"{current_date.year}-{current_date.month:02d}",
-                    '支出日期': current_date, 
-                    '付款频率': payment_frequency
-                })
-        return pd.DataFrame(admin_cost_data)
+        # 付款频率 -> 每次付款间隔的月数（同时也是每次付款覆盖的月数）
+        payment_months = self.data['付款频率'].map({'月度': 1, '季度': 3, '年度': 12}).to_numpy(dtype=float)
+        start_months = self.data['开始日期'].to_numpy().astype('datetime64[M]')
+        end_months = self.data['结束日期'].to_numpy().astype('datetime64[M]')
+        month_span = (end_months - start_months).astype(np.int64)
+
+        # 月度/季度按间隔覆盖开始月份至结束月份，年度只在开始月份付款一次
+        with np.errstate(invalid='ignore'):
+            payment_counts = np.where(payment_months == 12, 1, np.floor_divide(month_span, payment_months) + 1)
+        payment_counts = np.nan_to_num(np.clip(payment_counts, 0, None)).astype(np.int64)
+        row_idx = np.repeat(np.arange(len(self.data)), payment_counts)
+        payment_seq = np.arange(len(row_idx)) - np.repeat(np.cumsum(payment_counts) - payment_counts, payment_counts)
+        interval = payment_months[row_idx].astype(np.int64)
+        payment_dates = start_months[row_idx] + payment_seq * interval
+
+        expanded = self.data.iloc[row_idx]
+        # 二级分类转为category后，一级分类只需按类别映射一次
+        secondary_category = expanded['费用类型'].astype('category')
+        admin_monthly = pd.DataFrame({
+            '一级分类': secondary_category.map(self.get_primary_category).array,
+            '费用类型': secondary_category.array,
+            '费用项目': expanded['费用项目'].to_numpy(),
+            '月度成本': np.round(expanded['月度成本'].to_numpy() * interval, 2),
+            '支出月份': np.datetime_as_string(payment_dates, unit='M'),
+            '支出日期': payment_dates.astype('datetime64[ns]'),
+            '付款频率': expanded['付款频率'].to_numpy()
+        })
+        return DataManager.categorize_columns(admin_monthly, ['一级分类', '付款频率'])
     
     def get_primary_category(self, secondary_category):
         """根据二级分类获取一级分类"""
@@ -389,7 +759,9 @@ class ExportManager:
     def export_to_excel(data_dict: Dict[str, pd.DataFrame], filename: str) -> BytesIO:
         """将多个数据框导出到Excel文件"""
         output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        # xlsxwriter只写不读，比openpyxl快；不开启constant_memory，
+        # 因为pandas按列写入单元格，该模式下非首行数据会被丢弃
+        with pd.ExcelWriter(output, engine='xlsxwriter', engine_kwargs={'options': {'strings_to_urls': False}}) as writer:
             for sheet_name, df in data_dict.items():
                 df.to_excel(writer, sheet_name=sheet_name, index=False)
         output.seek(0)
@@ -399,13 +771,27 @@ class ExportManager:
     def export_to_csv(df: pd.DataFrame, filename: str) -> BytesIO:
         """将数据框导出到CSV文件"""
         output = BytesIO()
-        df.to_csv(output, index=False, encoding='utf-8')
+        try:
+            # 优先使用pyarrow的C++ CSV写入器
+            pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), output)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # 混合类型列无法转换为Arrow表时回退到pandas写入器
+            output = BytesIO()
+            df.to_csv(output, index=False, encoding='utf-8')
         output.seek(0)
         return output
 
+    @staticmethod
+    def render_image(fig, chart_name: str) -> bytes:
+        """将图表渲染为PNG字节，失败时抛出异常（供延迟下载使用，其中的Streamlit命令不会显示）"""
+        try:
+            return fig.to_image(format='png')
+        except Exception as e:
+            raise RuntimeError(f"图表 {chart_name} 导出失败: {str(e)}") from e
+
     @staticmethod
     def export_visualization(fig, filename: str) -> BytesIO:
-        """导出可视化图表为图片"""
+        """导出可视化图表为图片（脚本线程中同步调用，失败时显示错误信息）"""
         try:
             img_buffer = BytesIO()
             fig.write_image(img_buffer, format='png')
@@ -413,14 +799,25 @@ class ExportManager:
             return img_buffer
         except Exception as e:
             # 如果导出失败，显示错误信息但不中断程序
-            if "kaleido" in str(e):
+            if "kaleido" in str(e).lower():
                 st.error("图表导出需要安装kaleido包: pip install kaleido")
             else:
                 st.error(f"导出图表时发生错误: {str(e)}")
             return BytesIO()  # 返回空的BytesIO对象
 
+    @staticmethod
+    def export_visualizations_zip(charts: Dict[str, go.Figure]) -> BytesIO:
+        """逐张渲染图表并打包为ZIP，任一图表渲染失败即抛出异常，不生成缺图的压缩包"""
+        output = BytesIO()
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as zf:
+            for chart_name, fig in charts.items():
+                zf.writestr(f"{chart_name}.png", ExportManager.render_image(fig, chart_name))
+        output.seek(0)
+        return output
+
 
 
+@st.cache_data(show_spinner=False)
 def generate_template_data() -> Dict[str, pd.DataFrame]:
     """生成各类数据模板"""
     templates = {}
@@ -459,17 +856,149 @@ def generate_template_data() -> Dict[str, pd.DataFrame]:
     return templates
 
 
+@st.cache_resource(show_spinner=False)
+def template_csv_bytes(kind: str) -> bytes:
+    """生成模板CSV字节内容，模板固定不变，每个进程只生成一次"""
+    return generate_template_data()[kind].to_csv(index=False).encode('utf-8')
+
+
+def number_column_config(formats: Dict[str, str]) -> Dict[str, Any]:
+    """生成只读表格的数字列显示格式（printf风格），由前端渲染，不经过pandas Styler"""
+    return {col: st.column_config.NumberColumn(format=fmt) for col, fmt in formats.items()}
+
+
+def format_month_chinese(dates: pd.Series) -> pd.Series:
+    """将日期序列格式化为中文月份标签，如 2025年1月（只格式化不重复的日期，再按编码取回）"""
+    codes, uniques = pd.factorize(dates)
+    labels = (uniques.year.astype(str) + '年' + uniques.month.astype(str) + '月').to_numpy(dtype=object)
+    # 缺失日期的编码为-1，对应末尾追加的None
+    return pd.Series(np.append(labels, None)[codes], index=dates.index, dtype='str', name=dates.name)
+
+
+def monthly_cost_sum(df: pd.DataFrame, value_col: str) -> pd.Series:
+    """按支出月份（月初）重采样汇总成本，结果已按月份排序，跳过无数据的月份"""
+    months = pd.DatetimeIndex(pd.to_datetime(df['支出月份'], format='%Y-%m'), name='支出月份')
+    return df[value_col].set_axis(months).resample('MS').sum(min_count=1).dropna()
+
+
+def align_monthly_series(parts: List[pd.Series], columns: List[str]) -> pd.DataFrame:
+    """将以月份为索引的各项汇总Series一次外连接对齐为月度表（缺失月份填0，按月份排序）"""
+    return (
+        pd.concat(parts, axis=1)
+        .reindex(columns=columns)
+        .fillna(0).sort_index().rename_axis('月份').reset_index()
+    )
+
+
+def build_budget_summary(data_manager) -> pd.DataFrame:
+    """汇总收入、物料、人工和行政费用的月度预算数据"""
+    income_data = DataManager.ensure_datetime_columns(data_manager['income'].data, ['交付日期'])
+    material_monthly = data_manager['income'].generate_material_cost_data()
+    labor_monthly = data_manager['labor'].generate_cost_data()
+    admin_monthly = data_manager['admin'].generate_cost_data()
+    
+    # 各来源统一为 (月份, 类别, 金额) 长表，一次分组汇总到月份 × 类别
+    monthly_parts = [pd.DataFrame({
+        '月份': income_data['交付日期'].dt.strftime('%Y-%m'),
+        '类别': '纠偏后收入', '金额': income_data['纠偏后收入']
+    })]
+    for monthly_df, value_col in [(material_monthly, '物料成本'), (labor_monthly, '成本金额'), (admin_monthly, '月度成本')]:
+        if not monthly_df.empty:
+            monthly_parts.append(pd.DataFrame({'月份': monthly_df['支出月份'], '类别': value_col, '金额': monthly_df[value_col]}))
+    budget_summary = (
+        pd.concat(monthly_parts, ignore_index=True)
+        .groupby(['月份', '类别'], sort=False)['金额'].sum()
+        .unstack(fill_value=0)
+        .reindex(columns=['纠偏后收入', '物料成本', '成本金额', '月度成本'], fill_value=0)
+        .rename_axis(columns=None)
+        .reset_index()
+    )
+    
+    # 衍生指标直接在numpy数组上计算，避免中间Series和逐次索引对齐
+    total_income = budget_summary['纠偏后收入'].to_numpy(dtype=float)
+    total_expense = (budget_summary['物料成本'].to_numpy(dtype=float)
+                     + budget_summary['成本金额'].to_numpy(dtype=float)
+                     + budget_summary['月度成本'].to_numpy(dtype=float))
+    gross_profit = total_income - total_expense
+    budget_summary['总收入'] = total_income
+    budget_summary['总支出'] = total_expense
+    budget_summary['毛利润'] = gross_profit
+    budget_summary['毛利率'] = np.divide(gross_profit, total_income, out=np.zeros_like(gross_profit), where=total_income > 0) * 100
+    # 月份只解析一次，排序和中文标签共用
+    budget_summary['月份_dt'] = pd.to_datetime(budget_summary['月份'], format='%Y-%m')
+    budget_summary = budget_summary.sort_values('月份_dt')
+    budget_summary['月份_中文'] = format_month_chinese(budget_summary['月份_dt'])
+    return budget_summary.drop('月份_dt', axis=1)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_runway_summary(monthly_cash: pd.Series, material_df: pd.DataFrame, labor_df: pd.DataFrame,
+                         admin_df: pd.DataFrame, occasional_income: pd.DataFrame, occasional_expense: pd.DataFrame,
+                         cash_balance: float) -> pd.DataFrame:
+    """汇总各月现金流入流出并计算累计现金余额，按输入数据内容缓存，数据未变化时重跑不再重新聚合"""
+    # 各项按月份汇总为Series，外连接对齐得到全部月份，缺失月份填0（回款已按支付月份汇总）
+    monthly_parts = [monthly_cash.rename('收入')]
+    if not material_df.empty: monthly_parts.append(material_df.groupby('支出月份', sort=False)['物料成本'].sum())
+    if not labor_df.empty: monthly_parts.append(labor_df.groupby('支出月份', sort=False)['成本金额'].sum().rename('人工成本'))
+    if not admin_df.empty: monthly_parts.append(admin_df.groupby('支出月份', sort=False)['月度成本'].sum().rename('行政成本'))
+    if not occasional_income.empty: monthly_parts.append(occasional_income.groupby(occasional_income['收入日期'].dt.to_period('M').astype(str), sort=False)['收入金额'].sum().rename('偶然收入'))
+    if not occasional_expense.empty: monthly_parts.append(occasional_expense.groupby(occasional_expense['支出日期'].dt.to_period('M').astype(str), sort=False)['支出金额'].sum().rename('偶然支出'))
+    monthly_summary = align_monthly_series(monthly_parts, ['收入', '物料成本', '人工成本', '行政成本', '偶然收入', '偶然支出'])
+    monthly_summary['净现金流'] = monthly_summary['收入'] + monthly_summary['偶然收入'] - (monthly_summary['物料成本'] + monthly_summary['人工成本'] + monthly_summary['行政成本'] + monthly_summary['偶然支出'])
+    # 期初余额作为首项参与累加，与逐月递推的求和顺序一致
+    net_flow = monthly_summary['净现金流'].to_numpy(dtype=float)
+    monthly_summary['累计现金余额'] = np.cumsum(np.concatenate(([cash_balance], net_flow)))[1:]
+    return monthly_summary
+
+
+def _chart_cache_args(data_manager) -> tuple:
+    """将数据管理器拆解为可被st.cache_data哈希的参数"""
+    income_manager = data_manager['income']
+    return (
+        income_manager.data, tuple(sorted(income_manager.material_ratios.items())),
+        data_manager['labor'].data, data_manager['admin'].data
+    )
+
+
+def _restore_data_manager(income_df, material_ratios, labor_df, admin_df) -> Dict[str, Any]:
+    """根据缓存参数重建数据管理器"""
+    return {
+        'income': IncomeManager(income_df, dict(material_ratios)),
+        'labor': LaborCostManager(labor_df),
+        'admin': AdminCostManager(admin_df)
+    }
+
+
 def create_visualization_charts(data_manager, material_ratios) -> Dict[str, go.Figure]:
+    """创建所有可视化图表（按输入数据缓存）"""
+    # 收入摘要由会话中的收入管理器生成并复用其缓存，不在重建的管理器上重复聚合
+    summary_df = data_manager['income'].generate_summary()
+    return _cached_visualization_charts(*_chart_cache_args(data_manager), summary_df)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _cached_visualization_charts(income_df, material_ratios, labor_df, admin_df, summary_df) -> Dict[str, go.Figure]:
+    return _build_visualization_charts(_restore_data_manager(income_df, material_ratios, labor_df, admin_df), summary_df)
+
+
+@st.cache_data(show_spinner=False)
+def _build_decay_curve_figure() -> go.Figure:
+    """创建时间衰减曲线（不依赖任何数据，只构建一次）"""
+    fig_curve = go.Figure()
+    fig_curve.add_trace(go.Scatter(x=DECAY_CURVE_MONTHS, y=DECAY_CURVE_VALUES, mode='lines+markers', name='λ=0.0315', line=dict(color='#1a2a6c', width=3)))
+    fig_curve.update_layout(title='时间衰减曲线', xaxis_title='月份数', yaxis_title='衰减因子', yaxis_range=[0, 1.05], hovermode='x unified', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+    return fig_curve
+
+
+def _build_visualization_charts(data_manager, summary_df: pd.DataFrame) -> Dict[str, go.Figure]:
     """创建所有可视化图表"""
     charts = {}
     
     if not data_manager['income'].data.empty:
         # 季度收入分布
-        summary_df = data_manager['income'].generate_summary()
         quarterly_data = summary_df[summary_df['类别'] == '季度收入']
         if not quarterly_data.empty:
-            quarterly_data = quarterly_data.copy()
-            quarterly_data['项目_中文'] = quarterly_data['项目'].apply(lambda x: x.replace('-Q', '年Q'))
+            quarterly_data = quarterly_data.assign(项目_中文=quarterly_data['项目'].str.replace('-Q', '年Q', regex=False))
             fig_q = go.Figure()
             fig_q.add_trace(go.Bar(x=quarterly_data['项目_中文'], y=quarterly_data['金额'], name='纠偏后收入', marker_color='#1a2a6c'))
             fig_q.add_trace(go.Scatter(x=quarterly_data['项目_中文'], y=quarterly_data['累计占比'], name='累计占比', yaxis='y2', mode='lines+markers', line=dict(color='#ff2e2e', width=3), marker=dict(size=8)))
@@ -490,35 +1019,36 @@ def create_visualization_charts(data_manager, material_ratios) -> Dict[str, go.F
             charts['business_income_comparison'] = fig_b2
         
         # 时间衰减趋势
-        decay_data = data_manager['income'].data.copy()
-        decay_data['交付年月'] = pd.to_datetime(decay_data['交付日期']).dt.strftime('%Y-%m')
+        # 只读使用，无需复制全量数据
+        decay_data = data_manager['income'].data
+        # 参考线范围按全量数据计算，项目过多时再抽样以减少发送到浏览器的数据量
+        # （固定随机种子，同一数据每次得到相同的点，各业务线按原有比例保留）
+        max_val = float(np.nanmax(decay_data[['预期收入', '纠偏后收入']].to_numpy(dtype=float)))
+        if len(decay_data) > DECAY_SCATTER_MAX_POINTS:
+            # 按业务线分层抽样；用factorize编码分组，业务线缺失的项目也作为一层保留
+            business_codes = pd.factorize(decay_data['业务线'])[0]
+            decay_data = decay_data.groupby(business_codes).sample(
+                frac=DECAY_SCATTER_MAX_POINTS / len(decay_data), random_state=0
+            ).sort_index()
         fig_adj = px.scatter(decay_data, x='预期收入', y='纠偏后收入', size='纠偏后收入', color='业务线', hover_name='项目名称', hover_data=['合同金额', '保守成单率', '时间衰减因子'], title='纠偏后收入 vs 预期收入')
-        max_val = max(decay_data['预期收入'].max(), decay_data['纠偏后收入'].max())
         fig_adj.add_trace(go.Scatter(x=[0, max_val], y=[0, max_val], mode='lines', name='y=x参考线', line=dict(color='red', dash='dash')))
         fig_adj.update_layout(xaxis_title='预期收入', yaxis_title='纠偏后收入', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
         charts['decay_trend'] = fig_adj
         
         # 时间衰减曲线
-        months = np.arange(0, 25)
-        decay_values = np.exp(-0.0315 * months)
-        fig_curve = go.Figure()
-        fig_curve.add_trace(go.Scatter(x=months, y=decay_values, mode='lines+markers', name='λ=0.0315', line=dict(color='#1a2a6c', width=3)))
-        fig_curve.update_layout(title='时间衰减曲线', xaxis_title='月份数', yaxis_title='衰减因子', yaxis_range=[0, 1.05], hovermode='x unified', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-        charts['decay_curve'] = fig_curve
+        charts['decay_curve'] = _build_decay_curve_figure()
     
     # 物料支出分析
     if not data_manager['income'].data.empty:
         material_cost_df = data_manager['income'].generate_material_cost_data()
         if not material_cost_df.empty:
-            business_material_summary = material_cost_df.groupby('业务线').agg({'物料成本': 'sum', '物料支出比例': 'mean'}).reset_index()
+            business_material_summary = material_cost_df.groupby('业务线', observed=True).agg({'物料成本': 'sum', '物料支出比例': 'mean'}).reset_index()
             fig_material = px.pie(business_material_summary, values='物料成本', names='业务线', title='业务线物料支出分布', hole=0.3, color_discrete_sequence=px.colors.qualitative.Set3)
             fig_material.update_traces(textposition='inside', textinfo='percent+label')
             charts['material_distribution'] = fig_material
             
-            monthly_material_cost = material_cost_df.groupby('支出月份')['物料成本'].sum().reset_index()
-            monthly_material_cost['支出月份'] = pd.to_datetime(monthly_material_cost['支出月份'])
-            monthly_material_cost = monthly_material_cost.sort_values('支出月份')
-            monthly_material_cost['支出月份_中文'] = monthly_material_cost['支出月份'].apply(lambda x: f"{x.year}年{x.month}月")
+            monthly_material_cost = monthly_cost_sum(material_cost_df, '物料成本').reset_index()
+            monthly_material_cost['支出月份_中文'] = format_month_chinese(monthly_material_cost['支出月份'])
             fig_monthly_material = px.line(monthly_material_cost, x='支出月份_中文', y='物料成本', title='月度物料支出趋势', markers=True)
             fig_monthly_material.update_layout(xaxis_title='月份', yaxis_title='物料成本 (万元)', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
             charts['monthly_material_trend'] = fig_monthly_material
@@ -527,93 +1057,26 @@ def create_visualization_charts(data_manager, material_ratios) -> Dict[str, go.F
     if not data_manager['income'].data.empty:
         cash_flow_df = data_manager['income'].generate_cash_flow_data()
         if not cash_flow_df.empty:
-            monthly_cash_flow = cash_flow_df.groupby('支付月份').agg({'金额': 'sum'}).reset_index()
-            monthly_cash_flow['支付月份'] = pd.to_datetime(monthly_cash_flow['支付月份'])
+            monthly_cash_flow = cash_flow_df.groupby('支付月份', sort=False).agg({'金额': 'sum'}).reset_index()
+            monthly_cash_flow['支付月份'] = pd.to_datetime(monthly_cash_flow['支付月份'], format='%Y-%m')
             monthly_cash_flow = monthly_cash_flow.sort_values('支付月份')
-            monthly_cash_flow['支付月份_中文'] = monthly_cash_flow['支付月份'].apply(lambda x: f"{x.year}年{x.month}月")
+            monthly_cash_flow['支付月份_中文'] = format_month_chinese(monthly_cash_flow['支付月份'])
             
             fig_cf = go.Figure()
             for cash_type in cash_flow_df['现金流类型'].unique():
                 type_data = cash_flow_df[cash_flow_df['现金流类型'] == cash_type]
-                monthly_type = type_data.groupby('支付月份').agg({'金额': 'sum'}).reset_index()
-                monthly_type['支付月份'] = pd.to_datetime(monthly_type['支付月份'])
+                monthly_type = type_data.groupby('支付月份', sort=False).agg({'金额': 'sum'}).reset_index()
+                monthly_type['支付月份'] = pd.to_datetime(monthly_type['支付月份'], format='%Y-%m')
                 monthly_type = monthly_type.sort_values('支付月份')
-                monthly_type['支付月份_中文'] = monthly_type['支付月份'].apply(lambda x: f"{x.year}年{x.month}月")
+                monthly_type['支付月份_中文'] = format_month_chinese(monthly_type['支付月份'])
                 fig_cf.add_trace(go.Bar(x=monthly_type['支付月份'], y=monthly_type['金额'], name=cash_type, text=monthly_type['金额'], textposition='auto'))
             fig_cf.update_layout(title='月度现金流分布', xaxis_title='月份', yaxis_title='金额 (万元)', barmode='stack', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
             charts['cash_flow_distribution'] = fig_cf
     
     # 全面预算汇总
     if not data_manager['income'].data.empty:
-        income_monthly = data_manager['income'].data.copy()
-        income_monthly['交付月份'] = pd.to_datetime(income_monthly['交付日期']).dt.to_period('M')
-        income_summary = income_monthly.groupby('交付月份')['纠偏后收入'].sum().reset_index()
-        income_summary['月份'] = income_summary['交付月份'].astype(str)
-        
-        material_monthly = data_manager['income'].generate_material_cost_data()
-        if not material_monthly.empty: 
-            material_summary = material_monthly.groupby('支出月份')['物料成本'].sum().reset_index()
-        else: 
-            material_summary = pd.DataFrame(columns=['支出月份', '物料成本'])
-        
-        labor_monthly = data_manager['labor'].generate_cost_data()
-        if not labor_monthly.empty: 
-            labor_summary = labor_monthly.groupby('支出月份')['成本金额'].sum().reset_index()
-        else: 
-            labor_summary = pd.DataFrame(columns=['支出月份', '成本金额'])
-        
-        admin_monthly = data_manager['admin'].generate_cost_data()
-        if not admin_monthly.empty: 
-            admin_summary = admin_monthly.groupby('支出月份')['月度成本'].sum().reset_index()
-        else: 
-            admin_summary = pd.DataFrame(columns=['支出月份', '月度成本'])
-        
-        all_months = set()
-        if not income_summary.empty: 
-            all_months.update(income_summary['月份'])
-        if not material_summary.empty: 
-            all_months.update(material_summary['支出月份'])
-        if not labor_summary.empty: 
-            all_months.update(labor_summary['支出月份'])
-        if not admin_summary.empty: 
-            all_months.update(admin_summary['支出月份'])
-        
-        months_list = sorted(list(all_months))
-        budget_summary = pd.DataFrame({'月份': months_list})
-        
-        if not income_summary.empty:
-            budget_summary = budget_summary.merge(income_summary[['月份', '纠偏后收入']], on='月份', how='left').fillna(0)
-        else: 
-            budget_summary['纠偏后收入'] = 0
-        
-        if not material_summary.empty:
-            budget_summary = budget_summary.merge(material_summary[['支出月份', '物料成本']], left_on='月份', right_on='支出月份', how='left').fillna(0)
-            budget_summary.drop(columns=['支出月份'], inplace=True)
-        else: 
-            budget_summary['物料成本'] = 0
-        
-        if not labor_summary.empty:
-            budget_summary = budget_summary.merge(labor_summary[['支出月份', '成本金额']], left_on='月份', right_on='支出月份', how='left').fillna(0)
-            budget_summary.drop(columns=['支出月份'], inplace=True)
-        else: 
-            budget_summary['成本金额'] = 0
-        
-        if not admin_summary.empty:
-            budget_summary = budget_summary.merge(admin_summary[['支出月份', '月度成本']], left_on='月份', right_on='支出月份', how='left').fillna(0)
-            budget_summary.drop(columns=['支出月份'], inplace=True)
-        else: 
-            budget_summary['月度成本'] = 0
-        
-        budget_summary['总收入'] = budget_summary['纠偏后收入']
-        budget_summary['总支出'] = budget_summary['物料成本'] + budget_summary['成本金额'] + budget_summary['月度成本']
-        budget_summary['毛利润'] = budget_summary['总收入'] - budget_summary['总支出']
-        budget_summary['毛利率'] = np.where(budget_summary['总收入'] > 0, budget_summary['毛利润'] / budget_summary['总收入'] * 100, 0)
-        budget_summary['月份_dt'] = pd.to_datetime(budget_summary['月份'])
-        budget_summary = budget_summary.sort_values('月份_dt')
-        budget_summary = budget_summary.drop('月份_dt', axis=1)
-        budget_summary['月份_中文'] = pd.to_datetime(budget_summary['月份']).apply(lambda x: f"{x.year}年{x.month}月")
-        budget_summary = budget_summary.rename(columns={'月份': '月份_英文'})
-        budget_summary = budget_summary.rename(columns={'月份_中文': '月份'})
+        budget_summary = build_budget_summary(data_manager)
+        budget_summary = budget_summary.rename(columns={'月份': '月份_英文', '月份_中文': '月份'})
         
         fig_budget = go.Figure()
         fig_budget.add_trace(go.Bar(x=budget_summary['月份'], y=budget_summary['总收入'], name='总收入', marker_color='#1a2a6c'))
@@ -625,80 +1088,147 @@ def create_visualization_charts(data_manager, material_ratios) -> Dict[str, go.F
         
         fig_margin = go.Figure()
         fig_margin.add_trace(go.Scatter(x=budget_summary['月份'], y=budget_summary['毛利率'], mode='lines+markers', name='毛利率', line=dict(color='#1a2a6c', width=3), marker=dict(size=8)))
-        fig_margin.update_layout(title='月度毛利率趋势', xaxis_title='月份', yaxis_title='毛利率 (%)', yaxis_range=[-100, 100], plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+        fig_margin.update_layout(**MARGIN_TREND_LAYOUT)
         charts['margin_trend'] = fig_margin
     
+    # 固定uirevision，重跑时前端按Plotly.react增量更新并保留缩放、图例等交互状态
+    for fig in charts.values():
+        fig.update_layout(uirevision='keep')
     return charts
 def create_executive_dashboard_charts(data_manager):
+    """创建老板视角的经营概览图表（按输入数据缓存）"""
+    summary_df = data_manager['income'].generate_summary()
+    return _cached_executive_dashboard_charts(*_chart_cache_args(data_manager), summary_df)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _cached_executive_dashboard_charts(income_df, material_ratios, labor_df, admin_df, summary_df) -> Dict[str, go.Figure]:
+    return _build_executive_dashboard_charts(_restore_data_manager(income_df, material_ratios, labor_df, admin_df), summary_df)
+
+
+# 仪表盘与成本饼图只依赖几个汇总值，按汇总值缓存；
+# 修改付款比例、项目名称等不影响汇总值的编辑时可直接复用
+@st.cache_data(show_spinner=False, max_entries=8)
+def _build_overview_figure(total_revenue: float, total_profit: float, avg_margin: float) -> go.Figure:
+    """创建经营概览仪表板（总收入、总毛利润、平均毛利率）"""
+    fig_overview = go.Figure()
+    fig_overview.add_trace(go.Indicator(
+        mode="number+gauge+delta",
+        value=total_revenue,
+        domain={'x': [0, 1], 'y': [0.6, 1]},
+        title={'text': "总收入"},
+        gauge={
+            'shape': "bullet",
+            'axis': {'range': [None, max(total_revenue * 1.2, 1)]},
+            'bar': {'color': "#1a2a6c"},
+            'steps': [
+                {'range': [0, total_revenue * 0.5], 'color': "lightgray"},
+                {'range': [total_revenue * 0.5, total_revenue], 'color': "gray"}
+            ],
+            'threshold': {
+                'line': {'color': "red", 'width': 2},
+                'thickness': 0.75,
+                'value': total_revenue
+            }
+        }
+    ))
+
+    fig_overview.add_trace(go.Indicator(
+        mode="number+gauge+delta",
+        value=total_profit,
+        domain={'x': [0, 1], 'y': [0.3, 0.5]},
+        title={'text': "总毛利润"},
+        gauge={
+            'shape': "bullet",
+            'axis': {'range': [None, max(total_profit * 1.2, 1)]},
+            'bar': {'color': "#4ecdc4"},
+            'steps': [
+                {'range': [0, total_profit * 0.5], 'color': "lightgray"},
+                {'range': [total_profit * 0.5, total_profit], 'color': "gray"}
+            ],
+            'threshold': {
+                'line': {'color': "red", 'width': 2},
+                'thickness': 0.75,
+                'value': total_profit
+            }
+        }
+    ))
+
+    fig_overview.add_trace(go.Indicator(
+        mode="gauge+number+delta",
+        value=avg_margin,
+        domain={'x': [0, 1], 'y': [0, 0.2]},
+        title={'text': "平均毛利率"},
+        gauge={
+            'axis': {'range': [0, 100]},
+            'bar': {'color': "#f7b731"},
+            'steps': [
+                {'range': [0, 30], 'color': "lightcoral"},
+                {'range': [30, 50], 'color': "orange"},
+                {'range': [50, 100], 'color': "lightgreen"}
+            ],
+            'threshold': {
+                'line': {'color': "red", 'width': 4},
+                'thickness': 0.75,
+                'value': avg_margin
+            }
+        }
+    ))
+
+    fig_overview.update_layout(height=400, title="经营概览仪表板")
+    return fig_overview
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _build_cost_structure_figure(total_material: float, total_labor: float, total_admin: float) -> Optional[go.Figure]:
+    """创建总成本结构饼图，各项成本均为0时返回None"""
+    cost_labels = np.array(['物料成本', '人工成本', '行政费用'])
+    cost_values = np.array([total_material, total_labor, total_admin])
+
+    # 过滤掉零值以避免图表错误
+    mask = cost_values > 0
+    if mask.any():
+        fig_cost = go.Figure(go.Pie(
+            labels=cost_labels[mask],
+            values=cost_values[mask],
+            hole=0.3,
+            textposition='inside',
+            textinfo='percent+label'
+        ))
+        fig_cost.update_layout(title='总成本结构', piecolorway=px.colors.sequential.Plasma_r)
+        return fig_cost
+    return None
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _build_margin_trend_figure(months: tuple, margins: tuple, avg_margin: float) -> go.Figure:
+    """创建全面预算汇总页的月度毛利率趋势图（WebGL渲染），按月份、毛利率和平均值缓存"""
+    fig_margin = go.Figure()
+    fig_margin.add_trace(go.Scattergl(
+        x=list(months), 
+        y=list(margins), 
+        mode='lines+markers', 
+        name='毛利率', 
+        line=dict(color='#FF69B4', width=3),
+        marker=dict(size=8)
+    ))
+    fig_margin.add_hline(
+        y=avg_margin, 
+        line_dash="dash", 
+        line_color="red", 
+        annotation_text=f"平均毛利率: {avg_margin:.1f}%"
+    )
+    fig_margin.update_layout(**MARGIN_TREND_LAYOUT, hovermode='x unified')
+    return fig_margin
+
+
+def _build_executive_dashboard_charts(data_manager, summary_df: pd.DataFrame):
     """创建老板视角的经营概览图表"""
     charts = {}
     
     if not data_manager['income'].data.empty:
         # 获取预算汇总数据
-        income_monthly = data_manager['income'].data.copy()
-        income_monthly['交付月份'] = pd.to_datetime(income_monthly['交付日期']).dt.to_period('M')
-        income_summary = income_monthly.groupby('交付月份')['纠偏后收入'].sum().reset_index()
-        income_summary['月份'] = income_summary['交付月份'].astype(str)
-        
-        material_monthly = data_manager['income'].generate_material_cost_data()
-        if not material_monthly.empty: 
-            material_summary = material_monthly.groupby('支出月份')['物料成本'].sum().reset_index()
-        else: 
-            material_summary = pd.DataFrame(columns=['支出月份', '物料成本'])
-        
-        labor_monthly = data_manager['labor'].generate_cost_data()
-        if not labor_monthly.empty: 
-            labor_summary = labor_monthly.groupby('支出月份')['成本金额'].sum().reset_index()
-        else: 
-            labor_summary = pd.DataFrame(columns=['支出月份', '成本金额'])
-        
-        admin_monthly = data_manager['admin'].generate_cost_data()
-        if not admin_monthly.empty: 
-            admin_summary = admin_monthly.groupby('支出月份')['月度成本'].sum().reset_index()
-        else: 
-            admin_summary = pd.DataFrame(columns=['支出月份', '月度成本'])
-        
-        # 构建月度汇总数据
-        all_months = set()
-        if not income_summary.empty: all_months.update(income_summary['月份'])
-        if not material_summary.empty: all_months.update(material_summary['支出月份'])
-        if not labor_summary.empty: all_months.update(labor_summary['支出月份'])
-        if not admin_summary.empty: all_months.update(admin_summary['支出月份'])
-        
-        months_list = sorted(list(all_months))
-        budget_summary = pd.DataFrame({'月份': months_list})
-        
-        if not income_summary.empty:
-            budget_summary = budget_summary.merge(income_summary[['月份', '纠偏后收入']], on='月份', how='left').fillna(0)
-        else: 
-            budget_summary['纠偏后收入'] = 0
-        
-        if not material_summary.empty:
-            budget_summary = budget_summary.merge(material_summary[['支出月份', '物料成本']], left_on='月份', right_on='支出月份', how='left').fillna(0)
-            budget_summary.drop(columns=['支出月份'], inplace=True)
-        else: 
-            budget_summary['物料成本'] = 0
-        
-        if not labor_summary.empty:
-            budget_summary = budget_summary.merge(labor_summary[['支出月份', '成本金额']], left_on='月份', right_on='支出月份', how='left').fillna(0)
-            budget_summary.drop(columns=['支出月份'], inplace=True)
-        else: 
-            budget_summary['成本金额'] = 0
-        
-        if not admin_summary.empty:
-            budget_summary = budget_summary.merge(admin_summary[['支出月份', '月度成本']], left_on='月份', right_on='支出月份', how='left').fillna(0)
-            budget_summary.drop(columns=['支出月份'], inplace=True)
-        else: 
-            budget_summary['月度成本'] = 0
-        
-        budget_summary['总收入'] = budget_summary['纠偏后收入']
-        budget_summary['总支出'] = budget_summary['物料成本'] + budget_summary['成本金额'] + budget_summary['月度成本']
-        budget_summary['毛利润'] = budget_summary['总收入'] - budget_summary['总支出']
-        budget_summary['毛利率'] = np.where(budget_summary['总收入'] > 0, budget_summary['毛利润'] / budget_summary['总收入'] * 100, 0)
-        budget_summary['月份_dt'] = pd.to_datetime(budget_summary['月份'])
-        budget_summary = budget_summary.sort_values('月份_dt')
-        budget_summary = budget_summary.drop('月份_dt', axis=1)
-        budget_summary['月份_中文'] = pd.to_datetime(budget_summary['月份']).apply(lambda x: f"{x.year}年{x.month}月")
+        budget_summary = build_budget_summary(data_manager)
         
         # 1. 经营概览仪表板 - 整体关键指标
         total_revenue = budget_summary['总收入'].sum()
@@ -706,71 +1236,7 @@ def create_executive_dashboard_charts(data_manager):
         total_profit = budget_summary['毛利润'].sum()
         avg_margin = budget_summary['毛利率'].mean() if len(budget_summary) > 0 else 0
         
-        fig_overview = go.Figure()
-        fig_overview.add_trace(go.Indicator(
-            mode="number+gauge+delta",
-            value=total_revenue,
-            domain={'x': [0, 1], 'y': [0.6, 1]},
-            title={'text': "总收入"},
-            gauge={
-                'shape': "bullet",
-                'axis': {'range': [None, max(total_revenue * 1.2, 1)]},
-                'bar': {'color': "#1a2a6c"},
-                'steps': [
-                    {'range': [0, total_revenue * 0.5], 'color': "lightgray"},
-                    {'range': [total_revenue * 0.5, total_revenue], 'color': "gray"}
-                ],
-                'threshold': {
-                    'line': {'color': "red", 'width': 2},
-                    'thickness': 0.75,
-                    'value': total_revenue
-                }
-            }
-        ))
-        
-        fig_overview.add_trace(go.Indicator(
-            mode="number+gauge+delta",
-            value=total_profit,
-            domain={'x': [0, 1], 'y': [0.3, 0.5]},
-            title={'text': "总毛利润"},
-            gauge={
-                'shape': "bullet",
-                'axis': {'range': [None, max(total_profit * 1.2, 1)]},
-                'bar': {'color': "#4ecdc4"},
-                'steps': [
-                    {'range': [0, total_profit * 0.5], 'color': "lightgray"},
-                    {'range': [total_profit * 0.5, total_profit], 'color': "gray"}
-                ],
-                'threshold': {
-                    'line': {'color': "red", 'width': 2},
-                    'thickness': 0.75,
-                    'value': total_profit
-                }
-            }
-        ))
-        
-        fig_overview.add_trace(go.Indicator(
-            mode="gauge+number+delta",
-            value=avg_margin,
-            domain={'x': [0, 1], 'y': [0, 0.2]},
-            title={'text': "平均毛利率"},
-            gauge={
-                'axis': {'range': [0, 100]},
-                'bar': {'color': "#f7b731"},
-                'steps': [
-                    {'range': [0, 30], 'color': "lightcoral"},
-                    {'range': [30, 50], 'color': "orange"},
-                    {'range': [50, 100], 'color': "lightgreen"}
-                ],
-                'threshold': {
-                    'line': {'color': "red", 'width': 4},
-                    'thickness': 0.75,
-                    'value': avg_margin
-                }
-            }
-        ))
-        
-        fig_overview.update_layout(height=400, title="经营概览仪表板")
+        fig_overview = _build_overview_figure(float(total_revenue), float(total_profit), float(avg_margin))
         charts['executive_overview'] = fig_overview
         
         # 2. 收入与支出对比 - 清晰展示盈利状况
@@ -789,15 +1255,16 @@ def create_executive_dashboard_charts(data_manager):
         charts['profit_analysis'] = fig_profit
         
         # 3. 业务线贡献热力图 - 展示各业务线表现
-        summary_df = data_manager['income'].generate_summary()
         business_data = summary_df[summary_df['类别'] == '业务线']
         if not business_data.empty:
+            amounts = business_data['金额'].to_numpy(dtype=float)
+            contribution = business_data['贡献率'].to_numpy(dtype=float)
             fig_heatmap = go.Figure(data=go.Heatmap(
-                z=[[row['金额'] for _, row in business_data.iterrows()]],
+                z=[amounts],
                 x=business_data['项目'],
                 y=['业务线收入贡献'],
                 colorscale='Blues',
-                text=[[f"{row['金额']:.1f}万<br>{row['贡献率']:.1f}%" for _, row in business_data.iterrows()]],
+                text=[np.char.add(np.char.mod('%.1f万<br>', amounts), np.char.mod('%.1f%%', contribution))],
                 texttemplate="%{text}",
                 textfont={"size": 12}
             ))
@@ -809,25 +1276,29 @@ def create_executive_dashboard_charts(data_manager):
         total_labor = budget_summary['成本金额'].sum()
         total_admin = budget_summary['月度成本'].sum()
         
-        cost_labels = ['物料成本', '人工成本', '行政费用']
-        cost_values = [total_material, total_labor, total_admin]
-        
-        # 过滤掉零值以避免图表错误
-        filtered_data = [(label, value) for label, value in zip(cost_labels, cost_values) if value > 0]
-        if filtered_data:
-            labels, values = zip(*filtered_data)
-            fig_cost = px.pie(
-                values=values, 
-                names=labels, 
-                title='总成本结构',
-                hole=0.3,
-                color_discrete_sequence=px.colors.sequential.Plasma_r
-            )
-            fig_cost.update_traces(textposition='inside', textinfo='percent+label')
+        fig_cost = _build_cost_structure_figure(float(total_material), float(total_labor), float(total_admin))
+        if fig_cost is not None:
             charts['cost_structure'] = fig_cost
     
+    # 固定uirevision，重跑时前端按Plotly.react增量更新并保留缩放、图例等交互状态
+    for fig in charts.values():
+        fig.update_layout(uirevision='keep')
     return charts
 
+
+def delete_marked_rows(kind: str, edited: pd.DataFrame, label: str):
+    """删除按钮回调：移除编辑器中勾选删除的行并保存；回调在重跑前执行，无需再手动st.rerun()"""
+    remaining = edited[edited['删除'] == False].drop(columns=['删除'])
+    data_manager = st.session_state.data_manager
+    if kind in ('labor', 'admin'):
+        data_manager[kind].data = remaining
+        DataManager.save_data_to_json(remaining, f'{kind}_budget.json')
+    else:
+        data_manager['occasional'][kind] = remaining
+        DataManager.save_data_to_parquet(remaining, f'{kind}.parquet')
+    st.toast(f"已删除 {int((edited['删除'] == True).sum())} 项{label}！")
+
+
 def main():
     """主函数"""
     # 设置页面配置
@@ -839,29 +1310,7 @@ def main():
     )
 
     # 页面样式
-    st.markdown("""
-    <style>
-        body { background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%); font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; }
-        .main { background: rgba(255, 255, 255, 0.95); border-radius: 15px; padding: 20px; box-shadow: 0 10px 30px rgba(0, 0, 0, 0.1); }
-        .sidebar .sidebar-content { background: linear-gradient(135deg, #1a2a6c 0%, #2a5298 100%); color: white; }
-        .stButton>button { color: #ffffff; background: linear-gradient(135deg, #1a2a6c 0%, #2a5298 100%); border-radius: 8px; border: none; padding: 10px 20px; font-weight: bold; transition: all 0.3s ease; }
-        .stButton>button:hover { transform: translateY(-2px); box-shadow: 0 5px 15px rgba(0, 0, 0, 0.2); }
-        .stMetric { background: white; padding: 15px; border-radius: 10px; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08); border-left: 4px solid #1a2a6c; }
-        .stSelectbox>div>div, .stNumberInput>div>div, .stTextInput>div>div { border-radius: 8px; border: 1px solid #ddd; }
-        .stDownloadButton>button { background: linear-gradient(135deg, #2a9d8f 0%, #264653 100%); color: white; border-radius: 8px; border: none; padding: 10px 20px; font-weight: bold; }
-        .stTabs>div>div { border-bottom: 2px solid #e0e0e0; }
-        .stTabs>div>div>button { font-size: 16px; font-weight: 500; padding: 12px 20px; border-radius: 8px 8px 0 0; }
-        .stTabs>div>div>button[aria-selected="true"] { background: linear-gradient(135deg, #1a2a6c 0%, #2a5298 100%); color: white; border: 1px solid #1a2a6c; }
-        .stExpander { border-radius: 10px; border: 1px solid #e0e0e0; }
-        .stExpander>summary { background: #f8f9fa; padding: 10px; border-radius: 10px 10px 0 0; font-weight: bold; }
-        h1, h2, h3 { color: #1a2a6c; }
-        .css-1aumxhk { background: linear-gradient(135deg, #1a2a6c 0%, #2a5298 100%) !important; }
-        .stDataFrame { border: 1px solid #e0e0e0; border-radius: 8px; overflow: hidden; }
-        .stDataFrame>div>table { border-collapse: collapse; }
-        .stDataFrame>div>table th { background: linear-gradient(135deg, #1a2a6c 0%, #2a5298 100%); color: white; font-weight: bold; }
-        .stDataFrame>div>table td { border: 1px solid #e0e0e0; }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(APP_STYLE, unsafe_allow_html=True)
 
     st.markdown("<h1 style='text-align: center; color: #1a2a6c;'>📊 全面预算管理系统</h1>", unsafe_allow_html=True)
     st.markdown("<p style='text-align: center; color: #666;'>基于研发思维的严谨预算管理模型</p>", unsafe_allow_html=True)
@@ -875,16 +1324,14 @@ def main():
             'labor': LaborCostManager(DataManager.load_data_from_json('labor_budget.json')),
             'admin': AdminCostManager(DataManager.load_data_from_json('admin_budget.json')),
             'occasional': {
-                'occasional_income': DataManager.load_data_from_json('occasional_income.json'),  # 修改这里
-                'occasional_expense': DataManager.load_data_from_json('occasional_expense.json')  # 修改这里
+                'occasional_income': DataManager.load_data_from_parquet('occasional_income.parquet', legacy_json='occasional_income.json'),
+                'occasional_expense': DataManager.load_data_from_parquet('occasional_expense.parquet', legacy_json='occasional_expense.json')
             }
         }
     
 
     if 'material_ratios' not in st.session_state:
-        st.session_state.material_ratios = {
-            '光谱设备/服务': 0.30, '配液设备': 0.35, '自动化项目': 0.40
-        }
+        st.session_state.material_ratios = dict(DEFAULT_MATERIAL_RATIOS)
 
     if 'selected_page' not in st.session_state:
         st.session_state.selected_page = "收入预测"
@@ -919,15 +1366,25 @@ def main():
         st.markdown("---")
         st.header("导出功能")
         if st.button("📊 导出经营概览报告"):
-            charts = create_executive_dashboard_charts(st.session_state.data_manager)
-            for chart_name, chart_fig in charts.items():
-                img_buffer = ExportManager.export_visualization(chart_fig, f"{chart_name}.png")
+            if importlib.util.find_spec('kaleido') is None:
+                st.error("图表导出需要安装kaleido包: pip install kaleido")
+            else:
+                charts = create_executive_dashboard_charts(st.session_state.data_manager)
+                # ZIP在点击下载时才渲染；任一图表渲染失败即抛出异常，下载失败而不是得到缺图的压缩包
                 st.download_button(
-                    label=f"下载 {chart_name} 报告",
-                    data=img_buffer,
-                    file_name=f"{chart_name}.png",
-                    mime="image/png"
+                    label="下载全部图表 (ZIP)",
+                    data=partial(ExportManager.export_visualizations_zip, charts),
+                    file_name="经营概览报告.zip",
+                    mime="application/zip"
                 )
+                for chart_name, chart_fig in charts.items():
+                    # 图片在点击对应下载按钮时才渲染，不再一次性渲染全部图表；渲染失败时下载报错，不会得到空文件
+                    st.download_button(
+                        label=f"下载 {chart_name} 报告",
+                        data=partial(ExportManager.render_image, chart_fig, chart_name),
+                        file_name=f"{chart_name}.png",
+                        mime="image/png"
+                    )
 
         if st.button("📄 导出数据报表"):
             data_dict = {
@@ -1042,62 +1499,48 @@ def main():
                 delivery_datetime = datetime.combine(delivery_date, datetime.min.time())
                 month_diff = (delivery_datetime.year - base_datetime.year) * 12 + (delivery_datetime.month - base_datetime.month)
                 if month_diff < 0: month_diff = 0
-                time_decay = math.exp(-0.0315 * month_diff)
-                adjusted_rate = (close_rate / 100) * time_decay
-                expected_revenue = contract_amount * (close_rate / 100) * time_decay
+                time_decay, adjusted_rate, expected_revenue = compute_project_metrics(contract_amount, close_rate, month_diff)
                 adjusted_revenue = manual_adjusted_income
                 new_project = {
                     '项目名称': project_name, '交付日期': delivery_date, '合同金额': round(contract_amount, 2),
                     '保守成单率': f"{close_rate}%", '业务线': business_line, '时间衰减因子': round(time_decay, 4),
-                    '调整后成单率': f"{round(adjusted_rate * 100, 2)}%", '预期收入': round(expected_revenue, 2),
+                    '调整后成单率': f"{round(adjusted_rate, 2)}%", '预期收入': round(expected_revenue, 2),
                     '纠偏后收入': round(adjusted_revenue, 2), '首付款比例': first_payment_ratio,
                     '次付款比例': second_payment_ratio, '质保金比例': final_payment_ratio,
                     '交付月份': f"{delivery_date.year}-{delivery_date.month:02d}", '月份数': month_diff
                 }
-                new_df = pd.DataFrame([new_project])
-                if st.session_state.data_manager['income'].data.empty:
-                    st.session_state.data_manager['income'].data = new_df.copy()
-                else:
-                    st.session_state.data_manager['income'].data = pd.concat([st.session_state.data_manager['income'].data, new_df], ignore_index=True)
+                st.session_state.data_manager['income'].add_projects(pd.DataFrame([new_project]))
                 DataManager.save_data_to_json(st.session_state.data_manager['income'].data, 'income_budget.json')
                 st.success(f"项目 '{project_name}' 已成功添加！预期收入: {expected_revenue:.2f}万元，纠偏后收入: {adjusted_revenue:.2f}万元")
         
         st.subheader("📥 收入预测数据导入")
-        income_template_df = generate_template_data()['income']
-        income_template_csv = income_template_df.to_csv(index=False).encode('utf-8')
-        st.download_button(label="下载收入预测导入模板", data=income_template_csv, file_name="收入预测导入模板.csv", mime="text/csv")
+        st.download_button(label="下载收入预测导入模板", data=template_csv_bytes('income'), file_name="收入预测导入模板.csv", mime="text/csv")
         income_uploaded_file = st.file_uploader("上传收入预测数据 (CSV/Excel)", type=['csv', 'xlsx', 'xls'], key="income_upload")
         if income_uploaded_file is not None:
             if st.button("导入收入预测数据", type="primary", key="import_income"):
                 try:
-                    if income_uploaded_file.name.endswith('.csv'):
-                        df = pd.read_csv(income_uploaded_file)
-                    elif income_uploaded_file.name.endswith(('.xlsx', '.xls')):
-                        df = pd.read_excel(income_uploaded_file)
+                    df = DataManager.read_uploaded_table(income_uploaded_file)
                     required_columns = ['项目名称', '交付日期', '合同金额', '保守成单率', '业务线']
-                    missing_columns = [col for col in required_columns if col not in df.columns]
+                    present_columns = set(df.columns)
+                    missing_columns = [col for col in required_columns if col not in present_columns]
                     if missing_columns: st.error(f"文件缺少必要列: {', '.join(missing_columns)}")
                     else:
-                        df['交付日期'] = pd.to_datetime(df['交付日期'])
-                        base_datetime = datetime.combine(datetime(2025, 12, 8), datetime.min.time())
-                        for idx, row in df.iterrows():
-                            delivery_datetime = datetime.combine(row['交付日期'], datetime.min.time())
-                            month_diff = (delivery_datetime.year - base_datetime.year) * 12 + (delivery_datetime.month - base_datetime.month)
-                            if month_diff < 0: month_diff = 0
-                            time_decay = math.exp(-0.0315 * month_diff)
-                            close_rate = float(row['保守成单率'].replace('%', '')) if isinstance(row['保守成单率'], str) else row['保守成单率']
-                            expected_revenue = row['合同金额'] * (close_rate / 100) * time_decay
-                            df.loc[idx, '时间衰减因子'] = round(time_decay, 4)
-                            df.loc[idx, '调整后成单率'] = f"{round(close_rate * time_decay, 2)}%"
-                            df.loc[idx, '预期收入'] = round(expected_revenue, 2)
-                            df.loc[idx, '纠偏后收入'] = round(expected_revenue, 2)
-                            df.loc[idx, '交付月份'] = f"{row['交付日期'].year}-{row['交付日期'].month:02d}"
-                            df.loc[idx, '月份数'] = month_diff
+                        df = DataManager.ensure_datetime_columns(df, ['交付日期'])
+                        # 以2025年12月为基准计算月份差（早于基准按0计），整列计算衰减与收入
+                        month_diff = ((df['交付日期'].dt.year - 2025) * 12 + (df['交付日期'].dt.month - 12)).clip(lower=0)
+                        close_rate = pd.to_numeric(df['保守成单率'].astype(str).str.replace('%', '', regex=False))
+                        # 衰减因子直接对float64数组调用np.exp，不经过Series的ufunc分派和索引包装
+                        time_decay, adjusted_rate, expected_revenue = compute_project_metrics(
+                            df['合同金额'], close_rate, month_diff.to_numpy(dtype=np.float64)
+                        )
+                        df['时间衰减因子'] = time_decay.round(4)
+                        df['调整后成单率'] = adjusted_rate.round(2).astype(str) + '%'
+                        df['预期收入'] = expected_revenue.round(2)
+                        df['纠偏后收入'] = expected_revenue.round(2)
+                        df['交付月份'] = df['交付日期'].dt.strftime('%Y-%m')
+                        df['月份数'] = month_diff
                         df = DataManager.ensure_columns_compatibility(df)
-                        if st.session_state.data_manager['income'].data.empty:
-                            st.session_state.data_manager['income'].data = df.copy()
-                        else:
-                            st.session_state.data_manager['income'].data = pd.concat([st.session_state.data_manager['income'].data, df], ignore_index=True)
+                        st.session_state.data_manager['income'].add_projects(df)
                         DataManager.save_data_to_json(st.session_state.data_manager['income'].data, 'income_budget.json')
                         st.success(f"成功导入 {len(df)} 个收入预测项目！")
                 except Exception as e:
@@ -1106,7 +1549,8 @@ def main():
         # 项目明细编辑区
         st.header("📋 项目预测明细")
         
-        full_data = st.session_state.data_manager['income'].data.copy()
+        # 浅拷贝：只新增派生列，不改动原有数据，无需每次重跑都复制整表
+        full_data = st.session_state.data_manager['income'].data.copy(deep=False)
         if full_data.empty:
             st.info("暂无项目数据,请先新增或导入项目。")
             total_revenue_all = 0.0
@@ -1146,7 +1590,7 @@ def main():
                 sort_order = st.selectbox("排序方式", ["降序", "升序"], key="sort_order")
         
             # === 应用筛选 ===
-            filtered_df = full_data.copy()
+            filtered_df = full_data
             if business_filter != "全部":
                 filtered_df = filtered_df[filtered_df['业务线'] == business_filter]
             if month_filter != "全部":
@@ -1157,13 +1601,10 @@ def main():
             filtered_df = filtered_df.sort_values(by=sort_by, ascending=ascending)
         
             # === 准备显示列 ===
-            display_cols = [
-                'ID', '项目名称', '交付月份', '合同金额', '保守成单率',
-                '时间衰减因子', '调整后成单率', '预期收入', '纠偏后收入',
-                '首付款比例', '次付款比例', '质保金比例', '业务线'
-            ]
-            display_df = filtered_df[display_cols].copy()
-            display_df['删除'] = False
+            # 编辑器中可输入任意文本，category列需还原为普通字符串列
+            display_df = filtered_df[INCOME_EDITOR_COLUMNS].astype(
+                {col: object for col in INCOME_CATEGORY_COLUMNS if col in filtered_df.columns}
+            ).assign(删除=False)
         
             # === 数据编辑器 ===
             st.subheader("项目信息编辑")
@@ -1171,50 +1612,7 @@ def main():
                 display_df,
                 use_container_width=True,
                 num_rows="dynamic",
-                column_config={
-                    "ID": None,  # 隐藏 ID 列
-                    "项目名称": st.column_config.TextColumn("项目名称", width="medium"),
-                    "交付月份": st.column_config.TextColumn("交付月份", width="small"),
-                    "合同金额": st.column_config.NumberColumn("合同金额", format="%.2f", width="small"),
-                    "保守成单率": st.column_config.TextColumn("保守成单率", width="small"),
-                    "时间衰减因子": st.column_config.NumberColumn("时间衰减因子", format="%.4f", width="small"),
-                    "调整后成单率": st.column_config.TextColumn("调整后成单率", width="small"),
-                    "预期收入": st.column_config.NumberColumn("预期收入", format="%.2f", width="small"),
-                    "纠偏后收入": st.column_config.NumberColumn(
-                        "纠偏后收入", 
-                        help="直接输入调整后的收入金额", 
-                        min_value=0.0, 
-                        step=0.01,
-                        format="%.2f",
-                        width="small"
-                    ),
-                    "首付款比例": st.column_config.NumberColumn(
-                        "首付款比例(%)", 
-                        help="首付款占总收入的百分比", 
-                        min_value=0, 
-                        max_value=100, 
-                        step=1,
-                        width="small"
-                    ),
-                    "次付款比例": st.column_config.NumberColumn(
-                        "次付款比例(%)", 
-                        help="次付款占总收入的百分比", 
-                        min_value=0, 
-                        max_value=100, 
-                        step=1,
-                        width="small"
-                    ),
-                    "质保金比例": st.column_config.NumberColumn(
-                        "质保金比例(%)", 
-                        help="质保金占总收入的百分比", 
-                        min_value=0, 
-                        max_value=100, 
-                        step=1,
-                        width="small"
-                    ),
-                    "业务线": st.column_config.TextColumn("业务线", width="small"),
-                    "删除": st.column_config.CheckboxColumn("删除", help="勾选后立即删除", width="small")
-                },
+                column_config=INCOME_EDITOR_COLUMN_CONFIG,
                 key="filtered_project_editor"
             )
         
@@ -1243,7 +1641,7 @@ def main():
             original_no_del = display_df.drop(columns=['删除']) if '删除' in display_df.columns else display_df
             
             # 检查是否有修改
-            if not edited_no_del.equals(original_no_del):
+            if DataManager.editor_has_changes("filtered_project_editor", edited_no_del, original_no_del):
                 # 验证付款比例
                 total_ratios = (
                     edited_no_del['首付款比例'] + 
@@ -1258,17 +1656,16 @@ def main():
                 # 更新数据
                 income_data = st.session_state.data_manager['income'].data
                 
-                for _, row in edited_no_del.iterrows():
-                    project_id = row['ID']
-                    mask = income_data['ID'] == project_id
-                    
-                    if mask.any():
-                        idx = income_data[mask].index[0]
-                        # 只更新可编辑的字段
-                        income_data.loc[idx, '纠偏后收入'] = round(float(row['纠偏后收入']), 2)
-                        income_data.loc[idx, '首付款比例'] = int(row['首付款比例'])
-                        income_data.loc[idx, '次付款比例'] = int(row['次付款比例'])
-                        income_data.loc[idx, '质保金比例'] = int(row['质保金比例'])
+                # 按ID一次性回写可编辑字段：同一ID以编辑器中最后一行为准，只更新数据中第一条匹配记录
+                edited_by_id = edited_no_del.dropna(subset=['ID']).drop_duplicates('ID', keep='last').set_index('ID')
+                target = income_data['ID'].isin(edited_by_id.index) & ~income_data['ID'].duplicated()
+                if target.any():
+                    updates = edited_by_id.loc[income_data.loc[target, 'ID']]
+                    # 只更新可编辑的字段
+                    income_data.loc[target, '纠偏后收入'] = updates['纠偏后收入'].astype(float).round(2).to_numpy()
+                    for col in ['首付款比例', '次付款比例', '质保金比例']:
+                        # 先取整再转换为数据列本身的整数类型（如int32），避免赋值时类型不兼容
+                        income_data.loc[target, col] = updates[col].astype(int).astype(income_data[col].dtype).to_numpy()
         
                 # 保存更新
                 st.session_state.data_manager['income'].data = income_data
@@ -1277,9 +1674,13 @@ def main():
         
             # === 显示筛选后统计 ===
             st.divider()
-            total_revenue_filtered = filtered_df['预期收入'].sum()
-            total_adjusted_revenue_filtered = filtered_df['纠偏后收入'].sum()
-            total_contract_filtered = filtered_df['合同金额'].sum()
+            # 筛选后与全量数据的合计、均值各一次聚合，下方指标卡和仪表板共用
+            metric_columns = ['预期收入', '纠偏后收入', '合同金额']
+            filtered_stats = filtered_df[metric_columns].agg(['sum', 'mean'])
+            full_stats = full_data[metric_columns].agg(['sum', 'mean'])
+            total_revenue_filtered = filtered_stats.at['sum', '预期收入']
+            total_adjusted_revenue_filtered = filtered_stats.at['sum', '纠偏后收入']
+            total_contract_filtered = filtered_stats.at['sum', '合同金额']
             
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -1308,9 +1709,9 @@ def main():
             st.info(f"📊 共显示 **{len(filtered_df)}** 个项目 (总计 **{len(full_data)}** 个)")
         
             # === 全局汇总指标(用于下方图表) ===
-            total_revenue_all = full_data['预期收入'].sum()
-            total_adjusted_revenue_all = full_data['纠偏后收入'].sum()
-            total_contract_all = full_data['合同金额'].sum()
+            total_revenue_all = full_stats.at['sum', '预期收入']
+            total_adjusted_revenue_all = full_stats.at['sum', '纠偏后收入']
+            total_contract_all = full_stats.at['sum', '合同金额']
 
             # === 可视化分析区域 ===
             st.header("📈 收入预测可视化分析")
@@ -1320,7 +1721,7 @@ def main():
             
             with col1:
                 # 业务线收入分布饼图
-                business_revenue = full_data.groupby('业务线')['纠偏后收入'].sum().reset_index()
+                business_revenue = full_data.groupby('业务线', observed=True)['纠偏后收入'].sum().reset_index()
                 fig_pie = px.pie(business_revenue, values='纠偏后收入', names='业务线', 
                                 title='各业务线收入分布', 
                                 color_discrete_sequence=px.colors.sequential.Plasma_r)
@@ -1329,7 +1730,7 @@ def main():
             
             with col2:
                 # 月份收入趋势图
-                monthly_revenue = full_data.groupby('交付月份')['纠偏后收入'].sum().reset_index()
+                monthly_revenue = full_data.groupby('交付月份', sort=False, observed=True)['纠偏后收入'].sum().reset_index()
                 monthly_revenue = monthly_revenue.sort_values('交付月份')
                 fig_line = px.line(monthly_revenue, x='交付月份', y='纠偏后收入', 
                                   title='按月份收入趋势', 
@@ -1385,7 +1786,7 @@ def main():
             
             with col7:
                 # 各业务线统计摘要表
-                summary_stats = full_data.groupby('业务线').agg({
+                summary_stats = full_data.groupby('业务线', observed=True).agg({
                     '纠偏后收入': ['count', 'sum', 'mean', 'max', 'min'],
                     '合同金额': ['sum', 'mean'],
                     '时间衰减因子': 'mean'
@@ -1397,7 +1798,7 @@ def main():
             
             with col8:
                 # 项目数量和收入按月份统计
-                monthly_summary = full_data.groupby('交付月份').agg({
+                monthly_summary = full_data.groupby('交付月份', sort=False, observed=True).agg({
                     '项目名称': 'count',
                     '纠偏后收入': 'sum',
                     '合同金额': 'sum'
@@ -1432,8 +1833,8 @@ def main():
                 )
             
             with kpi_col2:
-                avg_contract = full_data['合同金额'].mean()
-                avg_filtered_contract = filtered_df['合同金额'].mean()
+                avg_contract = full_stats.at['mean', '合同金额']
+                avg_filtered_contract = filtered_stats.at['mean', '合同金额']
                 st.metric(
                     label="平均合同金额",
                     value=f"{avg_contract:.2f} 万元",
@@ -1441,8 +1842,8 @@ def main():
                 )
             
             with kpi_col3:
-                avg_revenue = full_data['纠偏后收入'].mean()
-                avg_filtered_revenue = filtered_df['纠偏后收入'].mean()
+                avg_revenue = full_stats.at['mean', '纠偏后收入']
+                avg_filtered_revenue = filtered_stats.at['mean', '纠偏后收入']
                 st.metric(
                     label="平均纠偏收入",
                     value=f"{avg_revenue:.2f} 万元",
@@ -1450,8 +1851,8 @@ def main():
                 )
             
             with kpi_col4:
-                success_rate = (full_data['纠偏后收入'].sum() / full_data['合同金额'].sum() * 100) if full_data['合同金额'].sum() > 0 else 0
-                filtered_success_rate = (filtered_df['纠偏后收入'].sum() / filtered_df['合同金额'].sum() * 100) if filtered_df['合同金额'].sum() > 0 else 0
+                success_rate = (total_adjusted_revenue_all / total_contract_all * 100) if total_contract_all > 0 else 0
+                filtered_success_rate = (total_adjusted_revenue_filtered / total_contract_filtered * 100) if total_contract_filtered > 0 else 0
                 st.metric(
                     label="整体转化率",
                     value=f"{success_rate:.1f}%",
@@ -1460,8 +1861,8 @@ def main():
 
             # 成单率分析
             st.subheader("📊 成单率分析")
-            full_data['保守成单率数值'] = full_data['保守成单率'].apply(lambda x: float(str(x).replace('%', '')))
-            full_data['调整后成单率数值'] = full_data['调整后成单率'].apply(lambda x: float(str(x).replace('%', '')))
+            full_data['保守成单率数值'] = full_data['保守成单率'].astype(str).str.replace('%', '', regex=False).astype(float)
+            full_data['调整后成单率数值'] = full_data['调整后成单率'].astype(str).str.replace('%', '', regex=False).astype(float)
             
             rate_comparison = full_data[['项目名称', '保守成单率数值', '调整后成单率数值']].melt(
                 id_vars=['项目名称'], var_name='成单率类型', value_name='成单率')
@@ -1486,25 +1887,22 @@ def main():
                     with col1: st.metric("总物料成本", f"{total_material_cost:.2f} 万元")
                     with col2: st.metric("毛利率", f"{((total_revenue - total_material_cost) / total_revenue * 100):.1f}%" if total_revenue > 0 else "0.0%")
                     with col3: st.metric("物料成本占比", f"{(total_material_cost / total_revenue * 100):.1f}%" if total_revenue > 0 else "0.0%")
-                    business_material_summary = material_cost_df.groupby('业务线').agg({'物料成本': 'sum', '物料支出比例': 'mean'}).reset_index()
+                    business_material_summary = material_cost_df.groupby('业务线', observed=True).agg({'物料成本': 'sum', '物料支出比例': 'mean'}).reset_index()
                     st.subheader("业务线物料支出分布")
                     fig_material = px.pie(business_material_summary, values='物料成本', names='业务线', title='业务线物料支出分布', hole=0.3, color_discrete_sequence=px.colors.qualitative.Set3)
                     fig_material.update_traces(textposition='inside', textinfo='percent+label')
                     st.plotly_chart(fig_material, use_container_width=True)
                     st.subheader("物料支出时间分布")
-                    monthly_material_cost = material_cost_df.groupby('支出月份')['物料成本'].sum().reset_index()
-                    monthly_material_cost['支出月份'] = pd.to_datetime(monthly_material_cost['支出月份'])
-                    monthly_material_cost = monthly_material_cost.sort_values('支出月份')
-                    monthly_material_cost['支出月份_中文'] = monthly_material_cost['支出月份'].apply(lambda x: f"{x.year}年{x.month}月")
+                    monthly_material_cost = monthly_cost_sum(material_cost_df, '物料成本').reset_index()
+                    monthly_material_cost['支出月份_中文'] = format_month_chinese(monthly_material_cost['支出月份'])
                     fig_monthly_material = px.line(monthly_material_cost, x='支出月份_中文', y='物料成本', title='月度物料支出趋势', markers=True)
-                    fig_monthly_material.update_layout(xaxis_title='月份', yaxis_title='物料成本 (万元)', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+                    fig_monthly_material.update_layout(xaxis_title='月份', yaxis_title='物料成本 (万元)', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', uirevision='keep')
                     st.plotly_chart(fig_monthly_material, use_container_width=True)
                     st.subheader("物料支出详情")
-                    material_display = material_cost_df[['项目名称', '业务线', '支出月份', '物料成本', '物料支出比例']].copy()
-                    material_display['支出月份_中文'] = pd.to_datetime(material_display['支出月份']).apply(lambda x: f"{x.year}年{x.month}月")
-                    material_display = material_display.rename(columns={'支出月份': '支出月份_英文'})
-                    material_display = material_display.rename(columns={'支出月份_中文': '支出月份'})
-                    st.dataframe(material_display.style.format({'物料成本': '{:.2f}', '物料支出比例': '{:.1f}%'}), use_container_width=True)
+                    material_display = material_cost_df[['项目名称', '业务线', '支出月份', '物料成本', '物料支出比例']]
+                    material_display = material_display.assign(支出月份_中文=format_month_chinese(pd.to_datetime(material_display['支出月份'], format='%Y-%m')))
+                    material_display = material_display.rename(columns={'支出月份': '支出月份_英文', '支出月份_中文': '支出月份'})
+                    st.dataframe(material_display, column_config=number_column_config({'物料成本': '%.2f', '物料支出比例': '%.1f%%'}), use_container_width=True)
                 else: st.info("暂无物料支出数据，需要先添加收入预算项目。")
             else: st.info("暂无项目数据。请先添加收入预算项目以进行物料支出分析。")
         
@@ -1524,38 +1922,27 @@ def main():
                         st.error("人员/部门不能为空")
                     else:
                         new_labor = {'成本类型': cost_type, '人员/部门': person_dept, '月度成本': round(monthly_cost, 2), '开始日期': start_date, '结束日期': end_date}
-                        new_df = pd.DataFrame([new_labor])
-                        if st.session_state.data_manager['labor'].data.empty:
-                            st.session_state.data_manager['labor'].data = new_df.copy()
-                        else:
-                            st.session_state.data_manager['labor'].data = pd.concat([st.session_state.data_manager['labor'].data, new_df], ignore_index=True)
+                        new_df = DataManager.ensure_datetime_columns(pd.DataFrame([new_labor]), ['开始日期', '结束日期'])
+                        st.session_state.data_manager['labor'].add_rows(new_df)
                         DataManager.save_data_to_json(st.session_state.data_manager['labor'].data, 'labor_budget.json')
                         st.success(f"人工成本项目 '{person_dept}' 已成功添加！")
             
             st.subheader("📥 人工成本模板导入")
-            labor_template_df = generate_template_data()['labor']
-            labor_template_csv = labor_template_df.to_csv(index=False).encode('utf-8')
-            st.download_button(label="下载人工成本导入模板", data=labor_template_csv, file_name="人工成本导入模板.csv", mime="text/csv")
+            st.download_button(label="下载人工成本导入模板", data=template_csv_bytes('labor'), file_name="人工成本导入模板.csv", mime="text/csv")
             labor_uploaded_file = st.file_uploader("上传人工成本数据 (CSV/Excel)", type=['csv', 'xlsx', 'xls'], key="labor_upload")
             if labor_uploaded_file is not None:
                 if st.button("导入人工成本数据", type="primary", key="import_labor"):
                     try:
-                        if labor_uploaded_file.name.endswith('.csv'): 
-                            df = pd.read_csv(labor_uploaded_file)
-                        elif labor_uploaded_file.name.endswith(('.xlsx', '.xls')): 
-                            df = pd.read_excel(labor_uploaded_file)
+                        df = DataManager.read_uploaded_table(labor_uploaded_file)
                         required_columns = ['成本类型', '人员/部门', '月度成本', '开始日期', '结束日期']
-                        missing_columns = [col for col in required_columns if col not in df.columns]
+                        present_columns = set(df.columns)
+                        missing_columns = [col for col in required_columns if col not in present_columns]
                         if missing_columns: 
                             st.error(f"文件缺少必要列: {', '.join(missing_columns)}")
                         else:
-                            df['开始日期'] = pd.to_datetime(df['开始日期'])
-                            df['结束日期'] = pd.to_datetime(df['结束日期'])
+                            df = DataManager.ensure_datetime_columns(df, ['开始日期', '结束日期'])
                             df['月度成本'] = df['月度成本'].round(2)
-                            if st.session_state.data_manager['labor'].data.empty:
-                                st.session_state.data_manager['labor'].data = df.copy()
-                            else:
-                                st.session_state.data_manager['labor'].data = pd.concat([st.session_state.data_manager['labor'].data, df], ignore_index=True)
+                            st.session_state.data_manager['labor'].add_rows(df)
                             DataManager.save_data_to_json(st.session_state.data_manager['labor'].data, 'labor_budget.json')
                             st.success(f"成功导入 {len(df)} 个人工成本项目！")
                     except Exception as e: 
@@ -1564,20 +1951,19 @@ def main():
             if not st.session_state.data_manager['labor'].data.empty:
                 st.subheader("人工成本明细")
                 # 确保日期列是datetime类型
-                labor_df = st.session_state.data_manager['labor'].data.copy()
-                for col in ['开始日期', '结束日期']:
-                    if col in labor_df.columns:
-                        labor_df[col] = pd.to_datetime(labor_df[col], errors='coerce')
+                labor_df = DataManager.ensure_datetime_columns(
+                    st.session_state.data_manager['labor'].data.copy(deep=False), ['开始日期', '结束日期'], errors='coerce'
+                )
                 
                 # 添加删除功能
                 labor_df['删除'] = False  # 添加删除列
                 edited_labor_df = st.data_editor(
-                    labor_df.style.format({'月度成本': '{:.2f}'}),
+                    labor_df,
                     use_container_width=True, 
                     num_rows="dynamic",
                     key="labor_data_editor",
                     column_config={
-                        "月度成本": st.column_config.NumberColumn("月度成本", help="每月的人工成本", min_value=0.0, step=0.01, default=0.0),
+                        "月度成本": st.column_config.NumberColumn("月度成本", help="每月的人工成本", min_value=0.0, step=0.01, default=0.0, format="%.2f"),
                         "删除": st.column_config.CheckboxColumn("删除", default=False)
                     }
                 )
@@ -1586,19 +1972,14 @@ def main():
                 if '删除' in edited_labor_df.columns:
                     rows_to_delete = edited_labor_df[edited_labor_df['删除'] == True]
                     if not rows_to_delete.empty:
-                        if st.button(f"🗑️ 删除 {len(rows_to_delete)} 项选中的人工成本", type="secondary"):
-                            st.session_state.data_manager['labor'].data = edited_labor_df[edited_labor_df['删除'] == False].drop(columns=['删除']).copy()
-                            DataManager.save_data_to_json(st.session_state.data_manager['labor'].data, 'labor_budget.json')
-                            st.success(f"已删除 {len(rows_to_delete)} 项人工成本！")
-                            st.rerun()  # 刷新页面以更新显示
+                        st.button(f"🗑️ 删除 {len(rows_to_delete)} 项选中的人工成本", type="secondary",
+                                  on_click=delete_marked_rows, args=('labor', edited_labor_df, '人工成本'))
                 
                 # 处理编辑操作（排除删除列）
                 edited_labor_df_filtered = edited_labor_df.drop(columns=['删除']) if '删除' in edited_labor_df.columns else edited_labor_df
-                if not edited_labor_df_filtered.equals(st.session_state.data_manager['labor'].data):
+                if DataManager.editor_has_changes("labor_data_editor", edited_labor_df_filtered, st.session_state.data_manager['labor'].data):
                     # 确保日期列的类型正确
-                    for col in ['开始日期', '结束日期']:
-                        if col in edited_labor_df_filtered.columns:
-                            edited_labor_df_filtered[col] = pd.to_datetime(edited_labor_df_filtered[col], errors='coerce')
+                    edited_labor_df_filtered = DataManager.ensure_datetime_columns(edited_labor_df_filtered, ['开始日期', '结束日期'], errors='coerce')
                     
                     # 确保数值列的类型正确
                     edited_labor_df_filtered['月度成本'] = edited_labor_df_filtered['月度成本'].round(2)
@@ -1610,7 +1991,9 @@ def main():
                 labor_monthly_df = st.session_state.data_manager['labor'].generate_cost_data()
                 if not labor_monthly_df.empty:
                     total_labor_cost = labor_monthly_df['成本金额'].sum()
-                    monthly_labor_avg = labor_monthly_df.groupby('支出月份')['成本金额'].sum().mean()
+                    # 月度汇总只分组一次，月均值和趋势图共用
+                    monthly_labor_cost = monthly_cost_sum(labor_monthly_df, '成本金额')
+                    monthly_labor_avg = monthly_labor_cost.mean()
                     col1, col2 = st.columns(2)
                     with col1: 
                         st.metric("总人工成本", f"{total_labor_cost:.2f} 万元")
@@ -1618,28 +2001,24 @@ def main():
                         st.metric("月均人工成本", f"{monthly_labor_avg:.2f} 万元")
                     
                     st.subheader("成本类型分布")
-                    type_summary = labor_monthly_df.groupby('成本类型')['成本金额'].sum().reset_index()
+                    type_summary = labor_monthly_df.groupby('成本类型', observed=True)['成本金额'].sum().reset_index()
                     fig_labor_type = px.pie(type_summary, values='成本金额', names='成本类型', title='人工成本类型分布', hole=0.3, color_discrete_sequence=px.colors.qualitative.Set3)
                     fig_labor_type.update_traces(textposition='inside', textinfo='percent+label')
                     st.plotly_chart(fig_labor_type, use_container_width=True)
                     
                     st.subheader("月度人工成本趋势")
-                    monthly_summary = labor_monthly_df.groupby('支出月份')['成本金额'].sum().reset_index()
-                    monthly_summary['支出月份'] = pd.to_datetime(monthly_summary['支出月份'])
-                    monthly_summary = monthly_summary.sort_values('支出月份')
-                    monthly_summary['支出月份_中文'] = monthly_summary['支出月份'].apply(lambda x: f"{x.year}年{x.month}月")
-                    monthly_summary = monthly_summary.rename(columns={'支出月份': '支出月份_英文'})
-                    monthly_summary = monthly_summary.rename(columns={'支出月份_中文': '支出月份'})
+                    monthly_summary = monthly_labor_cost.reset_index()
+                    monthly_summary['支出月份_中文'] = format_month_chinese(monthly_summary['支出月份'])
+                    monthly_summary = monthly_summary.rename(columns={'支出月份': '支出月份_英文', '支出月份_中文': '支出月份'})
                     fig_labor_monthly = px.line(monthly_summary, x='支出月份', y='成本金额', title='月度人工成本趋势', markers=True)
-                    fig_labor_monthly.update_layout(xaxis_title='月份', yaxis_title='人工成本 (万元)', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+                    fig_labor_monthly.update_layout(xaxis_title='月份', yaxis_title='人工成本 (万元)', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', uirevision='keep')
                     st.plotly_chart(fig_labor_monthly, use_container_width=True)
                     
                     st.subheader("人工成本详情")
-                    labor_display = labor_monthly_df.copy()
-                    labor_display['支出月份_中文'] = pd.to_datetime(labor_display['支出月份']).apply(lambda x: f"{x.year}年{x.month}月")
-                    labor_display = labor_display.rename(columns={'支出月份': '支出月份_英文'})
-                    labor_display = labor_display.rename(columns={'支出月份_中文': '支出月份'})
-                    st.dataframe(labor_display.style.format({'成本金额': '{:.2f}'}), use_container_width=True)
+                    # assign返回新DataFrame，不会改动CostManager缓存的成本数据
+                    labor_display = labor_monthly_df.assign(支出月份_中文=format_month_chinese(pd.to_datetime(labor_monthly_df['支出月份'], format='%Y-%m')))
+                    labor_display = labor_display.rename(columns={'支出月份': '支出月份_英文', '支出月份_中文': '支出月份'})
+                    st.dataframe(labor_display, column_config=number_column_config({'成本金额': '%.2f'}), use_container_width=True)
             else: 
                 st.info("暂无人工成本数据。请添加人工成本项目或导入数据。")
 
@@ -1689,39 +2068,28 @@ def main():
                             '结束日期': end_date, 
                             '付款频率': payment_frequency
                         }
-                        new_df = pd.DataFrame([new_admin])
-                        if st.session_state.data_manager['admin'].data.empty:
-                            st.session_state.data_manager['admin'].data = new_df.copy()
-                        else:
-                            st.session_state.data_manager['admin'].data = pd.concat([st.session_state.data_manager['admin'].data, new_df], ignore_index=True)
+                        new_df = DataManager.ensure_datetime_columns(pd.DataFrame([new_admin]), ['开始日期', '结束日期'])
+                        st.session_state.data_manager['admin'].add_rows(new_df)
                         DataManager.save_data_to_json(st.session_state.data_manager['admin'].data, 'admin_budget.json')
                         st.success(f"行政费用项目 '{expense_item}' 已成功添加！")
         
             # 导入模板
             st.subheader("📥 行政费用模板导入")
-            admin_template_df = generate_template_data()['admin']
-            admin_template_csv = admin_template_df.to_csv(index=False).encode('utf-8')
-            st.download_button(label="下载行政费用导入模板", data=admin_template_csv, file_name="行政费用导入模板.csv", mime="text/csv")
+            st.download_button(label="下载行政费用导入模板", data=template_csv_bytes('admin'), file_name="行政费用导入模板.csv", mime="text/csv")
             admin_uploaded_file = st.file_uploader("上传行政费用数据 (CSV/Excel)", type=['csv', 'xlsx', 'xls'], key="admin_upload")
             if admin_uploaded_file is not None:
                 if st.button("导入行政费用数据", type="primary", key="import_admin"):
                     try:
-                        if admin_uploaded_file.name.endswith('.csv'): 
-                            df = pd.read_csv(admin_uploaded_file)
-                        elif admin_uploaded_file.name.endswith(('.xlsx', '.xls')): 
-                            df = pd.read_excel(admin_uploaded_file)
+                        df = DataManager.read_uploaded_table(admin_uploaded_file)
                         required_columns = ['费用类型', '费用项目', '月度成本', '开始日期', '结束日期', '付款频率']
-                        missing_columns = [col for col in required_columns if col not in df.columns]
+                        present_columns = set(df.columns)
+                        missing_columns = [col for col in required_columns if col not in present_columns]
                         if missing_columns: 
                             st.error(f"文件缺少必要列: {', '.join(missing_columns)}")
                         else:
-                            df['开始日期'] = pd.to_datetime(df['开始日期'])
-                            df['结束日期'] = pd.to_datetime(df['结束日期'])
+                            df = DataManager.ensure_datetime_columns(df, ['开始日期', '结束日期'])
                             df['月度成本'] = df['月度成本'].round(2)
-                            if st.session_state.data_manager['admin'].data.empty:
-                                st.session_state.data_manager['admin'].data = df.copy()
-                            else:
-                                st.session_state.data_manager['admin'].data = pd.concat([st.session_state.data_manager['admin'].data, df], ignore_index=True)
+                            st.session_state.data_manager['admin'].add_rows(df)
                             DataManager.save_data_to_json(st.session_state.data_manager['admin'].data, 'admin_budget.json')
                             st.success(f"成功导入 {len(df)} 个行政费用项目！")
                     except Exception as e: 
@@ -1732,20 +2100,19 @@ def main():
                 st.subheader("行政费用明细")
                 
                 # 确保日期列是datetime类型
-                admin_df = st.session_state.data_manager['admin'].data.copy()
-                for col in ['开始日期', '结束日期']:
-                    if col in admin_df.columns:
-                        admin_df[col] = pd.to_datetime(admin_df[col], errors='coerce')
+                admin_df = DataManager.ensure_datetime_columns(
+                    st.session_state.data_manager['admin'].data.copy(deep=False), ['开始日期', '结束日期'], errors='coerce'
+                )
                 
                 # 添加删除功能
                 admin_df['删除'] = False  # 添加删除列
                 edited_admin_df = st.data_editor(
-                    admin_df.style.format({'月度成本': '{:.2f}'}),
+                    admin_df,
                     use_container_width=True, 
                     num_rows="dynamic",
                     key="admin_data_editor",
                     column_config={
-                        "月度成本": st.column_config.NumberColumn("月度成本", help="每月的行政费用", min_value=0.0, step=0.01, default=0.0),
+                        "月度成本": st.column_config.NumberColumn("月度成本", help="每月的行政费用", min_value=0.0, step=0.01, default=0.0, format="%.2f"),
                         "删除": st.column_config.CheckboxColumn("删除", default=False)
                     }
                 )
@@ -1754,19 +2121,14 @@ def main():
                 if '删除' in edited_admin_df.columns:
                     rows_to_delete = edited_admin_df[edited_admin_df['删除'] == True]
                     if not rows_to_delete.empty:
-                        if st.button(f"🗑️ 删除 {len(rows_to_delete)} 项选中的行政费用", type="secondary"):
-                            st.session_state.data_manager['admin'].data = edited_admin_df[edited_admin_df['删除'] == False].drop(columns=['删除']).copy()
-                            DataManager.save_data_to_json(st.session_state.data_manager['admin'].data, 'admin_budget.json')
-                            st.success(f"已删除 {len(rows_to_delete)} 项行政费用！")
-                            st.rerun()  # 刷新页面以更新显示
+                        st.button(f"🗑️ 删除 {len(rows_to_delete)} 项选中的行政费用", type="secondary",
+                                  on_click=delete_marked_rows, args=('admin', edited_admin_df, '行政费用'))
                 
                 # 处理编辑操作（排除删除列）
                 edited_admin_df_filtered = edited_admin_df.drop(columns=['删除']) if '删除' in edited_admin_df.columns else edited_admin_df
-                if not edited_admin_df_filtered.equals(st.session_state.data_manager['admin'].data):
+                if DataManager.editor_has_changes("admin_data_editor", edited_admin_df_filtered, st.session_state.data_manager['admin'].data):
                     # 确保日期列的类型正确
-                    for col in ['开始日期', '结束日期']:
-                        if col in edited_admin_df_filtered.columns:
-                            edited_admin_df_filtered[col] = pd.to_datetime(edited_admin_df_filtered[col], errors='coerce')
+                    edited_admin_df_filtered = DataManager.ensure_datetime_columns(edited_admin_df_filtered, ['开始日期', '结束日期'], errors='coerce')
                     
                     # 确保数值列的类型正确并保留两位小数
                     edited_admin_df_filtered['月度成本'] = edited_admin_df_filtered['月度成本'].round(2)
@@ -1778,7 +2140,9 @@ def main():
                 admin_monthly_df = st.session_state.data_manager['admin'].generate_cost_data()
                 if not admin_monthly_df.empty:
                     total_admin_cost = admin_monthly_df['月度成本'].sum()
-                    monthly_admin_avg = admin_monthly_df.groupby('支出月份')['月度成本'].sum().mean()
+                    # 月度汇总只分组一次，月均值和总体趋势图共用
+                    monthly_admin_cost = monthly_cost_sum(admin_monthly_df, '月度成本')
+                    monthly_admin_avg = monthly_admin_cost.mean()
                     col1, col2 = st.columns(2)
                     with col1: 
                         st.metric("总行政费用", f"{total_admin_cost:.2f} 万元")
@@ -1790,7 +2154,7 @@ def main():
                     
                     with analysis_tab1:
                         st.subheader("一级分类分布")
-                        primary_summary = admin_monthly_df.groupby('一级分类')['月度成本'].sum().reset_index()
+                        primary_summary = admin_monthly_df.groupby('一级分类', observed=True)['月度成本'].sum().reset_index()
                         fig_primary = px.pie(primary_summary, values='月度成本', names='一级分类', 
                                            title='行政费用一级分类分布', hole=0.3, 
                                            color_discrete_sequence=px.colors.qualitative.Set2)
@@ -1798,7 +2162,7 @@ def main():
                         st.plotly_chart(fig_primary, use_container_width=True)
                         
                         st.subheader("二级分类分布")
-                        type_summary = admin_monthly_df.groupby(['一级分类', '费用类型'])['月度成本'].sum().reset_index()
+                        type_summary = admin_monthly_df.groupby(['一级分类', '费用类型'], observed=True)['月度成本'].sum().reset_index()
                         fig_secondary = px.treemap(type_summary, path=['一级分类', '费用类型'], values='月度成本',
                                                  title='行政费用层级分布（树状图）',
                                                  color_discrete_sequence=px.colors.qualitative.Set3)
@@ -1809,7 +2173,8 @@ def main():
                             with st.expander(f"展开查看 {primary} 的二级分类详情", expanded=False):
                                 secondary_data = type_summary[type_summary['一级分类'] == primary]
                                 if not secondary_data.empty:
-                                    secondary_summary = secondary_data.groupby('费用类型')['月度成本'].sum().reset_index()
+                                    # type_summary已按(一级分类, 费用类型)汇总且有序，无需再次分组
+                                    secondary_summary = secondary_data[['费用类型', '月度成本']]
                                     fig_secondary_detail = px.bar(secondary_summary, x='费用类型', y='月度成本',
                                                                 title=f'{primary} - 二级分类详情',
                                                                 color='费用类型',
@@ -1819,44 +2184,40 @@ def main():
         
                     with analysis_tab2:
                         st.subheader("月度行政费用趋势")
-                        monthly_summary = admin_monthly_df.groupby(['支出月份', '一级分类'])['月度成本'].sum().reset_index()
-                        monthly_summary['支出月份'] = pd.to_datetime(monthly_summary['支出月份'])
+                        monthly_summary = admin_monthly_df.groupby(['支出月份', '一级分类'], observed=True)['月度成本'].sum().reset_index()
+                        monthly_summary['支出月份'] = pd.to_datetime(monthly_summary['支出月份'], format='%Y-%m')
                         monthly_summary = monthly_summary.sort_values('支出月份')
-                        monthly_summary['支出月份_中文'] = monthly_summary['支出月份'].apply(lambda x: f"{x.year}年{x.month}月")
+                        monthly_summary['支出月份_中文'] = format_month_chinese(monthly_summary['支出月份'])
                         
                         fig_monthly = px.line(monthly_summary, x='支出月份_中文', y='月度成本', color='一级分类',
                                             title='按一级分类的月度行政费用趋势', markers=True)
-                        fig_monthly.update_layout(xaxis_title='月份', yaxis_title='行政费用 (万元)')
+                        fig_monthly.update_layout(xaxis_title='月份', yaxis_title='行政费用 (万元)', uirevision='keep')
                         st.plotly_chart(fig_monthly, use_container_width=True)
                         
                         # 总体月度趋势
-                        overall_monthly = admin_monthly_df.groupby('支出月份')['月度成本'].sum().reset_index()
-                        overall_monthly['支出月份'] = pd.to_datetime(overall_monthly['支出月份'])
-                        overall_monthly = overall_monthly.sort_values('支出月份')
-                        overall_monthly['支出月份_中文'] = overall_monthly['支出月份'].apply(lambda x: f"{x.year}年{x.month}月")
+                        overall_monthly = monthly_admin_cost.reset_index()
+                        overall_monthly['支出月份_中文'] = format_month_chinese(overall_monthly['支出月份'])
                         
                         fig_overall = px.area(overall_monthly, x='支出月份_中文', y='月度成本',
                                             title='总体月度行政费用趋势', 
                                             labels={'月度成本': '行政费用 (万元)', '支出月份_中文': '月份'})
-                        fig_overall.update_layout(yaxis_title='行政费用 (万元)')
+                        fig_overall.update_layout(yaxis_title='行政费用 (万元)', uirevision='keep')
                         st.plotly_chart(fig_overall, use_container_width=True)
         
                     with analysis_tab3:
                         st.subheader("行政费用详情")
-                        admin_display = admin_monthly_df.copy()
-                        admin_display['支出月份_中文'] = pd.to_datetime(admin_display['支出月份']).apply(lambda x: f"{x.year}年{x.month}月")
-                        admin_display = admin_display.rename(columns={'支出月份': '支出月份_英文'})
-                        admin_display = admin_display.rename(columns={'支出月份_中文': '支出月份'})
+                        admin_display = admin_monthly_df.assign(支出月份_中文=format_month_chinese(pd.to_datetime(admin_monthly_df['支出月份'], format='%Y-%m')))
+                        admin_display = admin_display.rename(columns={'支出月份': '支出月份_英文', '支出月份_中文': '支出月份'})
                         # 重新排序列，使一级分类在费用类型之前
                         admin_display = admin_display[['一级分类', '费用类型', '费用项目', '支出月份', '月度成本', '付款频率', '支出日期']]
-                        st.dataframe(admin_display.style.format({'月度成本': '{:.2f}'}), use_container_width=True)
+                        st.dataframe(admin_display, column_config=number_column_config({'月度成本': '%.2f'}), use_container_width=True)
                         
                         # 按一级分类分组的详细数据
                         for primary in primary_summary['一级分类']:
                             with st.expander(f"展开查看 {primary} 的详细费用", expanded=False):
                                 primary_data = admin_display[admin_display['一级分类'] == primary]
                                 if not primary_data.empty:
-                                    st.dataframe(primary_data[['费用类型', '费用项目', '支出月份', '月度成本', '付款频率']].style.format({'月度成本': '{:.2f}'}), use_container_width=True)
+                                    st.dataframe(primary_data[['费用类型', '费用项目', '支出月份', '月度成本', '付款频率']], column_config=number_column_config({'月度成本': '%.2f'}), use_container_width=True)
         
             else: 
                 st.info("暂无行政费用数据。请添加行政费用项目或导入数据。")
@@ -1876,28 +2237,25 @@ def main():
                         st.error("收入名称不能为空")
                     else:
                         new_income = {'收入名称': income_name, '收入金额': round(income_amount, 2), '收入日期': income_date, '收入类型': income_type}
-                        new_df = pd.DataFrame([new_income])
-                        if st.session_state.data_manager['occasional']['occasional_income'].empty:
-                            st.session_state.data_manager['occasional']['occasional_income'] = new_df
-                        else:
-                            st.session_state.data_manager['occasional']['occasional_income'] = pd.concat([st.session_state.data_manager['occasional']['occasional_income'], new_df], ignore_index=True)
-                        DataManager.save_data_to_json(st.session_state.data_manager['occasional']['occasional_income'], 'occasional_income.json')
+                        new_df = DataManager.ensure_datetime_columns(pd.DataFrame([new_income]), ['收入日期'])
+                        occasional = st.session_state.data_manager['occasional']
+                        occasional['occasional_income'] = DataManager.append_rows(occasional['occasional_income'], new_df)
+                        DataManager.save_data_to_parquet(st.session_state.data_manager['occasional']['occasional_income'], 'occasional_income.parquet')
                         st.success(f"偶然收入 '{income_name}' 已添加！")
             
             if not st.session_state.data_manager['occasional']['occasional_income'].empty:
-                # 确保日期列是datetime类型
-                occasional_income_df = st.session_state.data_manager['occasional']['occasional_income'].copy()
-                if '收入日期' in occasional_income_df.columns:
-                    occasional_income_df['收入日期'] = pd.to_datetime(occasional_income_df['收入日期'], errors='coerce')
+                # 确保日期列是datetime类型（浅拷贝，只有需要转换的日期列会新分配）
+                occasional_income_df = DataManager.ensure_datetime_columns(
+                    st.session_state.data_manager['occasional']['occasional_income'].copy(deep=False), ['收入日期'], errors='coerce'
+                )
                 
-                # 添加删除功能
-                occasional_income_df['删除'] = False  # 添加删除列
+                # 添加删除功能：assign只新增一列布尔值，其余列与原数据共享
                 edited_income = st.data_editor(
-                    occasional_income_df.style.format({'收入金额': '{:.2f}'}),
+                    occasional_income_df.assign(删除=False),
                     use_container_width=True,
                     key="occasional_income_editor",
                     column_config={
-                        "收入金额": st.column_config.NumberColumn("收入金额", help="收入金额", min_value=0.0, step=0.01, default=0.0),
+                        "收入金额": st.column_config.NumberColumn("收入金额", help="收入金额", min_value=0.0, step=0.01, default=0.0, format="%.2f"),
                         "删除": st.column_config.CheckboxColumn("删除", default=False)
                     }
                 )
@@ -1906,23 +2264,19 @@ def main():
                 if '删除' in edited_income.columns:
                     rows_to_delete = edited_income[edited_income['删除'] == True]
                     if not rows_to_delete.empty:
-                        if st.button(f"🗑️ 删除 {len(rows_to_delete)} 项选中的偶然收入", type="secondary"):
-                            st.session_state.data_manager['occasional']['occasional_income'] = edited_income[edited_income['删除'] == False].drop(columns=['删除']).copy()
-                            DataManager.save_data_to_json(st.session_state.data_manager['occasional']['occasional_income'], 'occasional_income.json')
-                            st.success(f"已删除 {len(rows_to_delete)} 项偶然收入！")
-                            st.rerun()  # 刷新页面以更新显示
+                        st.button(f"🗑️ 删除 {len(rows_to_delete)} 项选中的偶然收入", type="secondary",
+                                  on_click=delete_marked_rows, args=('occasional_income', edited_income, '偶然收入'))
                 
                 # 处理编辑操作（排除删除列）
                 edited_income_filtered = edited_income.drop(columns=['删除']) if '删除' in edited_income.columns else edited_income
-                if not edited_income_filtered.equals(st.session_state.data_manager['occasional']['occasional_income']):
+                if DataManager.editor_has_changes("occasional_income_editor", edited_income_filtered, st.session_state.data_manager['occasional']['occasional_income']):
                     # 确保日期列的类型正确
-                    if '收入日期' in edited_income_filtered.columns:
-                        edited_income_filtered['收入日期'] = pd.to_datetime(edited_income_filtered['收入日期'], errors='coerce')
+                    edited_income_filtered = DataManager.ensure_datetime_columns(edited_income_filtered, ['收入日期'], errors='coerce')
                     
                     # 确保数值列的类型正确并保留两位小数
                     edited_income_filtered['收入金额'] = edited_income_filtered['收入金额'].round(2)
                     st.session_state.data_manager['occasional']['occasional_income'] = edited_income_filtered
-                    DataManager.save_data_to_json(st.session_state.data_manager['occasional']['occasional_income'], 'occasional_income.json')
+                    DataManager.save_data_to_parquet(st.session_state.data_manager['occasional']['occasional_income'], 'occasional_income.parquet')
                     st.success("偶然收入数据已更新！")
                 
                 total_occasional_income = st.session_state.data_manager['occasional']['occasional_income']['收入金额'].sum()
@@ -1942,28 +2296,25 @@ def main():
                         st.error("支出名称不能为空")
                     else:
                         new_expense = {'支出名称': expense_name, '支出金额': round(expense_amount, 2), '支出日期': expense_date, '支出类型': expense_type}
-                        new_df = pd.DataFrame([new_expense])
-                        if st.session_state.data_manager['occasional']['occasional_expense'].empty:
-                            st.session_state.data_manager['occasional']['occasional_expense'] = new_df
-                        else:
-                            st.session_state.data_manager['occasional']['occasional_expense'] = pd.concat([st.session_state.data_manager['occasional']['occasional_expense'], new_df], ignore_index=True)
-                        DataManager.save_data_to_json(st.session_state.data_manager['occasional']['occasional_expense'], 'occasional_expense.json')
+                        new_df = DataManager.ensure_datetime_columns(pd.DataFrame([new_expense]), ['支出日期'])
+                        occasional = st.session_state.data_manager['occasional']
+                        occasional['occasional_expense'] = DataManager.append_rows(occasional['occasional_expense'], new_df)
+                        DataManager.save_data_to_parquet(st.session_state.data_manager['occasional']['occasional_expense'], 'occasional_expense.parquet')
                         st.success(f"偶然支出 '{expense_name}' 已添加！")
             
             if not st.session_state.data_manager['occasional']['occasional_expense'].empty:
-                # 确保日期列是datetime类型
-                occasional_expense_df = st.session_state.data_manager['occasional']['occasional_expense'].copy()
-                if '支出日期' in occasional_expense_df.columns:
-                    occasional_expense_df['支出日期'] = pd.to_datetime(occasional_expense_df['支出日期'], errors='coerce')
+                # 确保日期列是datetime类型（浅拷贝，只有需要转换的日期列会新分配）
+                occasional_expense_df = DataManager.ensure_datetime_columns(
+                    st.session_state.data_manager['occasional']['occasional_expense'].copy(deep=False), ['支出日期'], errors='coerce'
+                )
                 
-                # 添加删除功能
-                occasional_expense_df['删除'] = False  # 添加删除列
+                # 添加删除功能：assign只新增一列布尔值，其余列与原数据共享
                 edited_expense = st.data_editor(
-                    occasional_expense_df.style.format({'支出金额': '{:.2f}'}),
+                    occasional_expense_df.assign(删除=False),
                     use_container_width=True,
                     key="occasional_expense_editor",
                     column_config={
-                        "支出金额": st.column_config.NumberColumn("支出金额", help="支出金额", min_value=0.0, step=0.01, default=0.0),
+                        "支出金额": st.column_config.NumberColumn("支出金额", help="支出金额", min_value=0.0, step=0.01, default=0.0, format="%.2f"),
                         "删除": st.column_config.CheckboxColumn("删除", default=False)
                     }
                 )
@@ -1972,23 +2323,19 @@ def main():
                 if '删除' in edited_expense.columns:
                     rows_to_delete = edited_expense[edited_expense['删除'] == True]
                     if not rows_to_delete.empty:
-                        if st.button(f"🗑️ 删除 {len(rows_to_delete)} 项选中的偶然支出", type="secondary"):
-                            st.session_state.data_manager['occasional']['occasional_expense'] = edited_expense[edited_expense['删除'] == False].drop(columns=['删除']).copy()
-                            DataManager.save_data_to_json(st.session_state.data_manager['occasional']['occasional_expense'], 'occasional_expense.json')
-                            st.success(f"已删除 {len(rows_to_delete)} 项偶然支出！")
-                            st.rerun()  # 刷新页面以更新显示
+                        st.button(f"🗑️ 删除 {len(rows_to_delete)} 项选中的偶然支出", type="secondary",
+                                  on_click=delete_marked_rows, args=('occasional_expense', edited_expense, '偶然支出'))
                 
                 # 处理编辑操作（排除删除列）
                 edited_expense_filtered = edited_expense.drop(columns=['删除']) if '删除' in edited_expense.columns else edited_expense
-                if not edited_expense_filtered.equals(st.session_state.data_manager['occasional']['occasional_expense']):
+                if DataManager.editor_has_changes("occasional_expense_editor", edited_expense_filtered, st.session_state.data_manager['occasional']['occasional_expense']):
                     # 确保日期列的类型正确
-                    if '支出日期' in edited_expense_filtered.columns:
-                        edited_expense_filtered['支出日期'] = pd.to_datetime(edited_expense_filtered['支出日期'], errors='coerce')
+                    edited_expense_filtered = DataManager.ensure_datetime_columns(edited_expense_filtered, ['支出日期'], errors='coerce')
                     
                     # 确保数值列的类型正确并保留两位小数
                     edited_expense_filtered['支出金额'] = edited_expense_filtered['支出金额'].round(2)
                     st.session_state.data_manager['occasional']['occasional_expense'] = edited_expense_filtered
-                    DataManager.save_data_to_json(st.session_state.data_manager['occasional']['occasional_expense'], 'occasional_expense.json')
+                    DataManager.save_data_to_parquet(st.session_state.data_manager['occasional']['occasional_expense'], 'occasional_expense.parquet')
                     st.success("偶然支出数据已更新！")
 
                 
@@ -2000,34 +2347,30 @@ def main():
         if not st.session_state.data_manager['income'].data.empty:
             cash_flow_df = st.session_state.data_manager['income'].generate_cash_flow_data()
             if not cash_flow_df.empty:
-                monthly_cash_flow = cash_flow_df.groupby('支付月份').agg({'金额': 'sum'}).reset_index()
-                monthly_cash_flow['支付月份'] = pd.to_datetime(monthly_cash_flow['支付月份'])
-                monthly_cash_flow = monthly_cash_flow.sort_values('支付月份')
-                monthly_cash_flow['支付月份_中文'] = monthly_cash_flow['支付月份'].apply(lambda x: f"{x.year}年{x.month}月")
-                monthly_cash_flow = monthly_cash_flow.rename(columns={'支付月份': '支付月份_英文'})
-                monthly_cash_flow = monthly_cash_flow.rename(columns={'支付月份_中文': '支付月份'})
+                # 月度回款汇总只计算一次，趋势图和Runway分析共用
+                monthly_cash = cash_flow_df.groupby('支付月份', sort=False)['金额'].sum()
                 fig_cf = go.Figure()
+                # 按月份和现金流类型一次分组汇总，再按类型拆分添加堆叠柱
+                monthly_by_type = cash_flow_df.groupby(['支付月份', '现金流类型'], sort=False, observed=True)['金额'].sum().reset_index()
+                monthly_by_type['支付月份_dt'] = pd.to_datetime(monthly_by_type['支付月份'], format='%Y-%m')
+                monthly_by_type = monthly_by_type.sort_values('支付月份_dt', kind='stable')
+                monthly_by_type['支付月份_中文'] = format_month_chinese(monthly_by_type['支付月份_dt'])
+                type_groups = dict(tuple(monthly_by_type.groupby('现金流类型', sort=False, observed=True)))
                 for cash_type in cash_flow_df['现金流类型'].unique():
-                    type_data = cash_flow_df[cash_flow_df['现金流类型'] == cash_type]
-                    monthly_type = type_data.groupby('支付月份').agg({'金额': 'sum'}).reset_index()
-                    monthly_type['支付月份'] = pd.to_datetime(monthly_type['支付月份'])
-                    monthly_type = monthly_type.sort_values('支付月份')
-                    monthly_type['支付月份_中文'] = monthly_type['支付月份'].apply(lambda x: f"{x.year}年{x.month}月")
-                    monthly_type = monthly_type.rename(columns={'支付月份': '支付月份_英文'})
-                    monthly_type = monthly_type.rename(columns={'支付月份_中文': '支付月份'})
-                    fig_cf.add_trace(go.Bar(x=monthly_type['支付月份'], y=monthly_type['金额'], name=cash_type, text=monthly_type['金额'], textposition='auto'))
+                    monthly_type = type_groups[cash_type]
+                    fig_cf.add_trace(go.Bar(x=monthly_type['支付月份_中文'], y=monthly_type['金额'], name=cash_type, text=monthly_type['金额'], textposition='auto'))
                 fig_cf.update_layout(title='月度现金流分布', xaxis_title='月份', yaxis_title='金额 (万元)', barmode='stack', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
                 st.plotly_chart(fig_cf, use_container_width=True)
                 st.subheader("现金流汇总")
-                cash_flow_summary = cash_flow_df.groupby('现金流类型').agg({'金额': 'sum'}).reset_index()
-                cash_flow_summary['占比'] = cash_flow_summary['金额'] / cash_flow_summary['金额'].sum() * 100
-                st.dataframe(cash_flow_summary.style.format({'金额': '{:.2f}', '占比': '{:.1f}%'}), use_container_width=True)
+                cash_flow_summary = cash_flow_df.groupby('现金流类型', observed=True).agg({'金额': 'sum'}).reset_index()
+                cash_flow_total = cash_flow_summary['金额'].sum()
+                cash_flow_summary['占比'] = cash_flow_summary['金额'] / cash_flow_total * 100 if cash_flow_total > 0 else 0.0
+                st.dataframe(cash_flow_summary, column_config=number_column_config({'金额': '%.2f', '占比': '%.1f%%'}), use_container_width=True)
                 st.subheader("现金流详情")
-                cash_flow_display = cash_flow_df[['项目名称', '现金流类型', '支付月份', '金额', '付款比例', '业务线']].copy()
-                cash_flow_display['支付月份_中文'] = pd.to_datetime(cash_flow_display['支付月份']).apply(lambda x: f"{x.year}年{x.month}月")
-                cash_flow_display = cash_flow_display.rename(columns={'支付月份': '支付月份_英文'})
-                cash_flow_display = cash_flow_display.rename(columns={'支付月份_中文': '支付月份'})
-                st.dataframe(cash_flow_display.style.format({'金额': '{:.2f}'}), use_container_width=True)
+                cash_flow_display = cash_flow_df[['项目名称', '现金流类型', '支付月份', '金额', '付款比例', '业务线']]
+                cash_flow_display = cash_flow_display.assign(支付月份_中文=format_month_chinese(pd.to_datetime(cash_flow_display['支付月份'], format='%Y-%m')))
+                cash_flow_display = cash_flow_display.rename(columns={'支付月份': '支付月份_英文', '支付月份_中文': '支付月份'})
+                st.dataframe(cash_flow_display, column_config=number_column_config({'金额': '%.2f'}), use_container_width=True)
                 st.subheader("收入与现金流对比")
                 col1, col2 = st.columns(2)
                 with col1:
@@ -2036,70 +2379,29 @@ def main():
                 with col2:
                     total_cash_flow = cash_flow_df['金额'].sum()
                     st.metric("总现金流", f"{total_cash_flow:.2f} 万元")
-                cash_flow_by_month = cash_flow_df.groupby('支付月份')['金额'].sum().reset_index()
-                cash_flow_by_month['支付月份'] = pd.to_datetime(cash_flow_by_month['支付月份'])
+                cash_flow_by_month = monthly_cash.reset_index()
+                cash_flow_by_month['支付月份'] = pd.to_datetime(cash_flow_by_month['支付月份'], format='%Y-%m')
                 cash_flow_by_month = cash_flow_by_month.sort_values('支付月份')
-                cash_flow_by_month['支付月份_中文'] = cash_flow_by_month['支付月份'].apply(lambda x: f"{x.year}年{x.month}月")
-                cash_flow_by_month = cash_flow_by_month.rename(columns={'支付月份': '支付月份_英文'})
-                cash_flow_by_month = cash_flow_by_month.rename(columns={'支付月份_中文': '支付月份'})
+                cash_flow_by_month['支付月份_中文'] = format_month_chinese(cash_flow_by_month['支付月份'])
+                cash_flow_by_month = cash_flow_by_month.rename(columns={'支付月份': '支付月份_英文', '支付月份_中文': '支付月份'})
                 fig_monthly = px.line(cash_flow_by_month, x='支付月份', y='金额', title='月度现金流趋势', markers=True)
                 fig_monthly.update_layout(xaxis_title='月份', yaxis_title='金额 (万元)', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
                 st.plotly_chart(fig_monthly, use_container_width=True)
                 st.subheader("💰 Runway分析")
                 if st.session_state.current_cash_balance > 0:
-                    monthly_income = cash_flow_df.groupby('支付月份')['金额'].sum().reset_index()
-                    monthly_income['支付月份'] = pd.to_datetime(monthly_income['支付月份'])
-                    material_df = st.session_state.data_manager['income'].generate_material_cost_data()
-                    labor_df = st.session_state.data_manager['labor'].generate_cost_data()
-                    admin_df = st.session_state.data_manager['admin'].generate_cost_data()
-                    all_months = set()
-                    if not monthly_income.empty: all_months.update(monthly_income['支付月份'].dt.to_period('M').astype(str))
-                    if not material_df.empty: all_months.update(material_df['支出月份'])
-                    if not labor_df.empty: all_months.update(labor_df['支出月份'])
-                    if not admin_df.empty: all_months.update(admin_df['支出月份'])
-                    if not st.session_state.data_manager['occasional']['occasional_income'].empty:
-                        all_months.update(st.session_state.data_manager['occasional']['occasional_income']['收入日期'].dt.to_period('M').astype(str))
-                    if not st.session_state.data_manager['occasional']['occasional_expense'].empty:
-                        all_months.update(st.session_state.data_manager['occasional']['occasional_expense']['支出日期'].dt.to_period('M').astype(str))
-                    months_list = sorted(list(all_months))
-                    monthly_summary = pd.DataFrame({'月份': months_list})
-                    monthly_income['月份'] = monthly_income['支付月份'].dt.to_period('M').astype(str)
-                    monthly_summary = monthly_summary.merge(monthly_income[['月份', '金额']], on='月份', how='left').fillna(0)
-                    monthly_summary.rename(columns={'金额': '收入'}, inplace=True)
-                    if not material_df.empty:
-                        material_monthly = material_df.groupby('支出月份')['物料成本'].sum().reset_index()
-                        material_monthly.columns = ['月份', '物料成本']
-                        monthly_summary = monthly_summary.merge(material_monthly, on='月份', how='left').fillna(0)
-                    else: monthly_summary['物料成本'] = 0
-                    if not labor_df.empty:
-                        labor_monthly = labor_df.groupby('支出月份')['成本金额'].sum().reset_index()
-                        labor_monthly.columns = ['月份', '人工成本']
-                        monthly_summary = monthly_summary.merge(labor_monthly, on='月份', how='left').fillna(0)
-                    else: monthly_summary['人工成本'] = 0
-                    if not admin_df.empty:
-                        admin_monthly = admin_df.groupby('支出月份')['月度成本'].sum().reset_index()
-                        admin_monthly.columns = ['月份', '行政成本']
-                        monthly_summary = monthly_summary.merge(admin_monthly, on='月份', how='left').fillna(0)
-                    else: monthly_summary['行政成本'] = 0
-                    if not st.session_state.data_manager['occasional']['occasional_income'].empty:
-                        occasional_income_monthly = st.session_state.data_manager['occasional']['occasional_income'].groupby(st.session_state.data_manager['occasional']['occasional_income']['收入日期'].dt.to_period('M').astype(str))['收入金额'].sum().reset_index()
-                        occasional_income_monthly.columns = ['月份', '偶然收入']
-                        monthly_summary = monthly_summary.merge(occasional_income_monthly, on='月份', how='left').fillna(0)
-                    else: monthly_summary['偶然收入'] = 0
-                    if not st.session_state.data_manager['occasional']['occasional_expense'].empty:
-                        occasional_expense_monthly = st.session_state.data_manager['occasional']['occasional_expense'].groupby(st.session_state.data_manager['occasional']['occasional_expense']['支出日期'].dt.to_period('M').astype(str))['支出金额'].sum().reset_index()
-                        occasional_expense_monthly.columns = ['月份', '偶然支出']
-                        monthly_summary = monthly_summary.merge(occasional_expense_monthly, on='月份', how='left').fillna(0)
-                    else: monthly_summary['偶然支出'] = 0
-                    monthly_summary['净现金流'] = monthly_summary['收入'] + monthly_summary['偶然收入'] - (monthly_summary['物料成本'] + monthly_summary['人工成本'] + monthly_summary['行政成本'] + monthly_summary['偶然支出'])
-                    monthly_summary['累计现金余额'] = st.session_state.current_cash_balance
-                    for i in range(len(monthly_summary)):
-                        if i == 0: monthly_summary.loc[i, '累计现金余额'] = st.session_state.current_cash_balance + monthly_summary.loc[i, '净现金流']
-                        else: monthly_summary.loc[i, '累计现金余额'] = monthly_summary.loc[i-1, '累计现金余额'] + monthly_summary.loc[i, '净现金流']
-                    runway_months = 0
-                    for idx, row in monthly_summary.iterrows():
-                        if row['累计现金余额'] <= 0: break
-                        runway_months += 1
+                    data_manager = st.session_state.data_manager
+                    monthly_summary = build_runway_summary(
+                        monthly_cash,
+                        data_manager['income'].generate_material_cost_data(),
+                        data_manager['labor'].generate_cost_data(),
+                        data_manager['admin'].generate_cost_data(),
+                        data_manager['occasional']['occasional_income'],
+                        data_manager['occasional']['occasional_expense'],
+                        st.session_state.current_cash_balance,
+                    )
+                    # 余额首次不为正之前的月数；始终为正时即为全部月数
+                    depleted = np.flatnonzero(monthly_summary['累计现金余额'].to_numpy() <= 0)
+                    runway_months = int(depleted[0]) if depleted.size else len(monthly_summary)
                     st.metric("当前现金余额", f"{st.session_state.current_cash_balance:.2f} 万元")
                     st.metric("预计Runway", f"{runway_months} 个月")
                     fig_runway = go.Figure()
@@ -2108,10 +2410,10 @@ def main():
                     fig_runway.update_layout(title='现金余额趋势', xaxis_title='月份', yaxis_title='累计现金余额 (万元)', hovermode='x unified', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
                     st.plotly_chart(fig_runway, use_container_width=True)
                     st.subheader("现金流详情表")
-                    runway_display = monthly_summary[['月份', '收入', '物料成本', '人工成本', '行政成本', '偶然收入', '偶然支出', '净现金流', '累计现金余额']].copy()
-                    st.dataframe(runway_display.style.format({
-                        '收入': '{:.2f}', '物料成本': '{:.2f}', '人工成本': '{:.2f}', '行政成本': '{:.2f}',
-                        '偶然收入': '{:.2f}', '偶然支出': '{:.2f}', '净现金流': '{:.2f}', '累计现金余额': '{:.2f}'
+                    runway_display = monthly_summary[['月份', '收入', '物料成本', '人工成本', '行政成本', '偶然收入', '偶然支出', '净现金流', '累计现金余额']]
+                    st.dataframe(runway_display, column_config=number_column_config({
+                        '收入': '%.2f', '物料成本': '%.2f', '人工成本': '%.2f', '行政成本': '%.2f',
+                        '偶然收入': '%.2f', '偶然支出': '%.2f', '净现金流': '%.2f', '累计现金余额': '%.2f'
                     }), use_container_width=True)
                 else: st.info("请在系统配置中设置当前现金余额以进行Runway分析。")
             else: st.info("暂无现金流数据，需要先添加收入预算项目。")
@@ -2126,14 +2428,14 @@ def main():
         with col1:
             start_month = st.selectbox(
                 "开始月份", 
-                options=[f"{year}-{month:02d}" for year in range(2025, 2030) for month in range(1, 13)],
+                options=BUDGET_MONTH_OPTIONS,
                 index=12,  # 默认2025年1月
                 help="选择分析的起始月份"
             )
         with col2:
             end_month = st.selectbox(
                 "结束月份", 
-                options=[f"{year}-{month:02d}" for year in range(2025, 2030) for month in range(1, 13)],
+                options=BUDGET_MONTH_OPTIONS,
                 index=24,  # 默认2026年1月
                 help="选择分析的结束月份"
             )
@@ -2142,177 +2444,101 @@ def main():
         if start_month > end_month:
             st.error("开始月份不能晚于结束月份！")
         elif not st.session_state.data_manager['income'].data.empty:
+            # 各项直接汇总为以月份为索引的Series，不复制源数据、不再reset_index/set_index往返
             # === 收入汇总 ===
-            income_monthly = st.session_state.data_manager['income'].data.copy()
-            income_monthly['交付月份'] = pd.to_datetime(income_monthly['交付日期']).dt.to_period('M')
-            income_summary = income_monthly.groupby('交付月份')['纠偏后收入'].sum().reset_index()
-            income_summary['月份'] = income_summary['交付月份'].astype(str)
+            income_data = DataManager.ensure_datetime_columns(st.session_state.data_manager['income'].data, ['交付日期'])
+            income_summary = income_data['纠偏后收入'].groupby(
+                income_data['交付日期'].dt.to_period('M').astype(str), sort=False
+            ).sum()
     
             # === 物料成本 ===
             material_monthly = st.session_state.data_manager['income'].generate_material_cost_data()
             if not material_monthly.empty:
-                material_summary = material_monthly.groupby('支出月份')['物料成本'].sum().reset_index()
+                material_summary = material_monthly.groupby('支出月份', sort=False)['物料成本'].sum()
             else:
-                material_summary = pd.DataFrame({'支出月份': [], '物料成本': []})
+                material_summary = pd.Series(name='物料成本', dtype=float)
     
             # === 人工成本 ===
             labor_monthly = st.session_state.data_manager['labor'].generate_cost_data()
             if not labor_monthly.empty:
-                labor_summary = labor_monthly.groupby('支出月份')['成本金额'].sum().reset_index()
+                labor_summary = labor_monthly.groupby('支出月份', sort=False)['成本金额'].sum()
             else:
-                labor_summary = pd.DataFrame({'支出月份': [], '成本金额': []})
+                labor_summary = pd.Series(name='成本金额', dtype=float)
     
             # === 行政费用 ===
             admin_monthly = st.session_state.data_manager['admin'].generate_cost_data()
             if not admin_monthly.empty:
-                admin_summary = admin_monthly.groupby('支出月份')['月度成本'].sum().reset_index()
+                admin_summary = admin_monthly.groupby('支出月份', sort=False)['月度成本'].sum()
             else:
-                admin_summary = pd.DataFrame({'支出月份': [], '月度成本': []})
+                admin_summary = pd.Series(name='月度成本', dtype=float)
     
             # === 偶然收入 ===
-            if not st.session_state.data_manager['occasional']['occasional_income'].empty:
-                df_inc = st.session_state.data_manager['occasional']['occasional_income'].copy()
-                df_inc['月份'] = pd.to_datetime(df_inc['收入日期']).dt.to_period('M').astype(str)
-                occasional_income_monthly = df_inc.groupby('月份')['收入金额'].sum().reset_index()
-                occasional_income_monthly.rename(columns={'收入金额': '偶然收入'}, inplace=True)
+            df_inc = st.session_state.data_manager['occasional']['occasional_income']
+            if not df_inc.empty:
+                occasional_income_monthly = df_inc['收入金额'].groupby(
+                    DataManager.ensure_datetime_columns(df_inc, ['收入日期'])['收入日期'].dt.to_period('M').astype(str), sort=False
+                ).sum().rename('偶然收入')
             else:
-                occasional_income_monthly = pd.DataFrame({'月份': [], '偶然收入': []})
+                occasional_income_monthly = pd.Series(name='偶然收入', dtype=float)
     
             # === 偶然支出 ===
-            if not st.session_state.data_manager['occasional']['occasional_expense'].empty:
-                df_exp = st.session_state.data_manager['occasional']['occasional_expense'].copy()
-                df_exp['月份'] = pd.to_datetime(df_exp['支出日期']).dt.to_period('M').astype(str)
-                occasional_expense_monthly = df_exp.groupby('月份')['支出金额'].sum().reset_index()
-                occasional_expense_monthly.rename(columns={'支出金额': '偶然支出'}, inplace=True)
+            df_exp = st.session_state.data_manager['occasional']['occasional_expense']
+            if not df_exp.empty:
+                occasional_expense_monthly = df_exp['支出金额'].groupby(
+                    DataManager.ensure_datetime_columns(df_exp, ['支出日期'])['支出日期'].dt.to_period('M').astype(str), sort=False
+                ).sum().rename('偶然支出')
             else:
-                occasional_expense_monthly = pd.DataFrame({'月份': [], '偶然支出': []})
+                occasional_expense_monthly = pd.Series(name='偶然支出', dtype=float)
     
-            # === 收集所有月份 ===
-            all_months = set()
-            if not income_summary.empty:
-                all_months.update(income_summary['月份'])
-            if not material_summary.empty:
-                all_months.update(material_summary['支出月份'])
-            if not labor_summary.empty:
-                all_months.update(labor_summary['支出月份'])
-            if not admin_summary.empty:
-                all_months.update(admin_summary['支出月份'])
-            if not occasional_income_monthly.empty:
-                all_months.update(occasional_income_monthly['月份'])
-            if not occasional_expense_monthly.empty:
-                all_months.update(occasional_expense_monthly['月份'])
-    
-            months_list = sorted(list(all_months))
-            budget_summary = pd.DataFrame({'月份': months_list})
-    
-            # === 合并各项数据 ===
-            # 收入
-            if not income_summary.empty:
-                budget_summary = budget_summary.merge(
-                    income_summary[['月份', '纠偏后收入']], on='月份', how='left'
-                )
-            else:
-                budget_summary['纠偏后收入'] = 0
-    
-            # 物料成本
-            if not material_summary.empty:
-                budget_summary = budget_summary.merge(
-                    material_summary[['支出月份', '物料成本']],
-                    left_on='月份', right_on='支出月份', how='left'
-                ).drop(columns=['支出月份'])
-            else:
-                budget_summary['物料成本'] = 0
-    
-            # 人工成本
-            if not labor_summary.empty:
-                budget_summary = budget_summary.merge(
-                    labor_summary[['支出月份', '成本金额']],
-                    left_on='月份', right_on='支出月份', how='left'
-                ).drop(columns=['支出月份'])
-            else:
-                budget_summary['成本金额'] = 0
-    
-            # 行政费用
-            if not admin_summary.empty:
-                budget_summary = budget_summary.merge(
-                    admin_summary[['支出月份', '月度成本']],
-                    left_on='月份', right_on='支出月份', how='left'
-                ).drop(columns=['支出月份'])
-            else:
-                budget_summary['月度成本'] = 0
-    
-            # 偶然收入
-            if not occasional_income_monthly.empty and '偶然收入' in occasional_income_monthly.columns:
-                budget_summary = budget_summary.merge(
-                    occasional_income_monthly[['月份', '偶然收入']], on='月份', how='left'
-                )
-            else:
-                budget_summary['偶然收入'] = 0
-    
-            # 偶然支出
-            if not occasional_expense_monthly.empty and '偶然支出' in occasional_expense_monthly.columns:
-                budget_summary = budget_summary.merge(
-                    occasional_expense_monthly[['月份', '偶然支出']], on='月份', how='left'
-                )
-            else:
-                budget_summary['偶然支出'] = 0
-    
-            # 统一填充缺失值
-            budget_summary = budget_summary.fillna(0)
+            # === 按月份对齐合并各项数据（外连接取所有月份，缺失值填0）===
+            budget_summary = align_monthly_series(
+                [income_summary, material_summary, labor_summary, admin_summary, occasional_income_monthly, occasional_expense_monthly],
+                ['纠偏后收入', '物料成本', '成本金额', '月度成本', '偶然收入', '偶然支出'],
+            )
     
             # === 计算衍生指标 ===
-            budget_summary['总收入'] = budget_summary['纠偏后收入'] + budget_summary['偶然收入']
-            budget_summary['总支出'] = (
-                budget_summary['物料成本'] +
-                budget_summary['成本金额'] +
-                budget_summary['月度成本'] +
-                budget_summary['偶然支出']
-            )
-            budget_summary['毛利润'] = budget_summary['总收入'] - budget_summary['总支出']
-            budget_summary['毛利率'] = np.where(
-                budget_summary['总收入'] > 0,
-                budget_summary['毛利润'] / budget_summary['总收入'] * 100,
-                0
-            )
-            budget_summary['净利润率'] = np.where(
-                budget_summary['总收入'] > 0,
-                budget_summary['毛利润'] / budget_summary['总收入'] * 100,
-                0
-            )
-            budget_summary['运营支出'] = budget_summary['物料成本'] + budget_summary['成本金额'] + budget_summary['月度成本']
-            budget_summary['运营支出率'] = np.where(
-                budget_summary['总收入'] > 0,
-                budget_summary['运营支出'] / budget_summary['总收入'] * 100,
-                0
-            )
+            material = budget_summary['物料成本'].to_numpy(dtype=float)
+            labor = budget_summary['成本金额'].to_numpy(dtype=float)
+            admin = budget_summary['月度成本'].to_numpy(dtype=float)
+            total_income = budget_summary['纠偏后收入'].to_numpy(dtype=float) + budget_summary['偶然收入'].to_numpy(dtype=float)
+            operating_expense = material + labor + admin
+            total_expense = operating_expense + budget_summary['偶然支出'].to_numpy(dtype=float)
+            gross_profit = total_income - total_expense
+            margin = np.divide(gross_profit, total_income, out=np.zeros_like(gross_profit), where=total_income > 0) * 100
+            budget_summary['总收入'] = total_income
+            budget_summary['总支出'] = total_expense
+            budget_summary['毛利润'] = gross_profit
+            budget_summary['毛利率'] = margin
+            budget_summary['净利润率'] = margin
+            budget_summary['运营支出'] = operating_expense
+            budget_summary['运营支出率'] = np.divide(operating_expense, total_income, out=np.zeros_like(operating_expense), where=total_income > 0) * 100
     
             # === 按时间段筛选数据 ===
             filtered_budget = budget_summary[
                 (budget_summary['月份'] >= start_month) & (budget_summary['月份'] <= end_month)
-            ].copy()
+            ]
     
             if filtered_budget.empty:
                 st.warning(f"在时间段 {start_month} 到 {end_month} 内没有数据，请检查您的预算数据。")
             else:
                 # === 排序与格式化月份 ===
-                filtered_budget['月份_dt'] = pd.to_datetime(filtered_budget['月份'])
-                filtered_budget = filtered_budget.sort_values('月份_dt').drop(columns=['月份_dt'])
-                filtered_budget['月份_中文'] = pd.to_datetime(filtered_budget['月份']).apply(
-                    lambda x: f"{x.year}年{x.month}月"
-                )
+                filtered_budget = filtered_budget.assign(月份_dt=pd.to_datetime(filtered_budget['月份'], format='%Y-%m'))
+                filtered_budget = filtered_budget.sort_values('月份_dt')
+                filtered_budget = filtered_budget.assign(月份_中文=format_month_chinese(filtered_budget['月份_dt']))
+                filtered_budget = filtered_budget.drop(columns=['月份_dt'])
                 filtered_budget = filtered_budget.rename(columns={'月份': '月份_英文', '月份_中文': '月份'})
     
                 # === 阶段性订单分析 - 项目生命周期视图 ===
                 st.subheader(f"📊 {start_month} 至 {end_month} 阶段性订单分析")
                 
                 # 项目按生命周期阶段分组
-                project_data = st.session_state.data_manager['income'].data.copy()
-                project_data['交付月份'] = pd.to_datetime(project_data['交付日期']).dt.to_period('M').astype(str)
+                project_data = DataManager.ensure_datetime_columns(st.session_state.data_manager['income'].data.copy(deep=False), ['交付日期'])
+                project_data['交付月份'] = project_data['交付日期'].dt.to_period('M').astype(str)
                 
                 # 按时间段筛选项目
                 filtered_projects = project_data[
                     (project_data['交付月份'] >= start_month) & (project_data['交付月份'] <= end_month)
-                ].copy()
+                ]
                 
                 if not filtered_projects.empty:
                     # 项目生命周期分析
@@ -2320,7 +2546,7 @@ def main():
                     
                     with col1:
                         # 按业务线的项目分布
-                        business_project_summary = filtered_projects.groupby('业务线').agg({
+                        business_project_summary = filtered_projects.groupby('业务线', observed=True).agg({
                             '项目名称': 'count',
                             '纠偏后收入': 'sum',
                             '合同金额': 'sum'
@@ -2561,30 +2787,9 @@ def main():
                 with analysis_tabs[2]:
                     st.subheader("盈利能力分析")
                     
-                    # 毛利率趋势
-                    fig_margin = go.Figure()
-                    fig_margin.add_trace(go.Scatter(
-                        x=filtered_budget['月份'], 
-                        y=filtered_budget['毛利率'], 
-                        mode='lines+markers', 
-                        name='毛利率', 
-                        line=dict(color='#FF69B4', width=3),
-                        marker=dict(size=8)
-                    ))
-                    fig_margin.add_hline(
-                        y=avg_margin, 
-                        line_dash="dash", 
-                        line_color="red", 
-                        annotation_text=f"平均毛利率: {avg_margin:.1f}%"
-                    )
-                    fig_margin.update_layout(
-                        title='月度毛利率趋势',
-                        xaxis_title='月份',
-                        yaxis_title='毛利率 (%)',
-                        yaxis_range=[-100, 100],
-                        hovermode='x unified',
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        paper_bgcolor='rgba(0,0,0,0)'
+                    # 毛利率趋势（以元组传入，缓存键哈希开销小）
+                    fig_margin = _build_margin_trend_figure(
+                        tuple(filtered_budget['月份']), tuple(filtered_budget['毛利率']), float(avg_margin)
                     )
                     st.plotly_chart(fig_margin, use_container_width=True)
                     
@@ -2668,7 +2873,7 @@ def main():
                         st.plotly_chart(project_timeline, use_container_width=True)
                         
                         # 项目交付密度图
-                        delivery_density = filtered_projects.groupby('交付月份').agg({
+                        delivery_density = filtered_projects.groupby('交付月份', observed=True).agg({
                             '项目名称': 'count',
                             '纠偏后收入': 'sum'
                         }).reset_index()
@@ -2731,36 +2936,38 @@ def main():
                         
                         # 项目详情表格
                         st.subheader("项目详情")
-                        project_display = filtered_projects[['项目名称', '业务线', '交付月份', '合同金额', '纠偏后收入']].copy()
+                        project_display = filtered_projects[['项目名称', '业务线', '交付月份', '合同金额', '纠偏后收入']]
                         project_display = project_display.rename(columns={'交付月份': '交付月份_中文'})
                         st.dataframe(
-                            project_display.style.format({
-                                '合同金额': '¥{:.2f}万',
-                                '纠偏后收入': '¥{:.2f}万',
-                                '毛利率': '{:.2f}%'
+                            project_display,
+                            column_config=number_column_config({
+                                '合同金额': '¥%.2f万',
+                                '纠偏后收入': '¥%.2f万',
+                                '毛利率': '%.2f%%'
                             }),
                             use_container_width=True
                         )
     
                 with analysis_tabs[4]:
                     st.subheader("月度预算汇总表")
-                    budget_display = filtered_budget.copy()
+                    budget_display = filtered_budget
                     budget_display = budget_display.rename(columns={'月份': '月份_中文'})
                     
                     # 格式化显示
                     st.dataframe(
-                        budget_display.style.format({
-                            '总收入': '¥{:.2f}万', 
-                            '纠偏后收入': '¥{:.2f}万', 
-                            '物料成本': '¥{:.2f}万', 
-                            '成本金额': '¥{:.2f}万',
-                            '月度成本': '¥{:.2f}万', 
-                            '偶然收入': '¥{:.2f}万', 
-                            '偶然支出': '¥{:.2f}万',
-                            '总支出': '¥{:.2f}万', 
-                            '毛利润': '¥{:.2f}万',
-                            '毛利率': '{:.2f}%',
-                            '运营支出率': '{:.2f}%'
+                        budget_display,
+                        column_config=number_column_config({
+                            '总收入': '¥%.2f万',
+                            '纠偏后收入': '¥%.2f万',
+                            '物料成本': '¥%.2f万',
+                            '成本金额': '¥%.2f万',
+                            '月度成本': '¥%.2f万',
+                            '偶然收入': '¥%.2f万',
+                            '偶然支出': '¥%.2f万',
+                            '总支出': '¥%.2f万',
+                            '毛利润': '¥%.2f万',
+                            '毛利率': '%.2f%%',
+                            '运营支出率': '%.2f%%'
                         }),
                         use_container_width=True
                     )
@@ -2805,78 +3012,16 @@ def main():
             st.info("暂无收入数据。请先添加收入预算项目以生成全面预算汇总表。")
 
     st.header("❓ 模型说明")
-    with st.expander("点击展开查看详细说明"):
-        st.markdown("""
-        ### 双重风险预测模型
-        
-        **核心公式**: `纠偏后收入 = 直接输入（无需计算系数）`
-        
-        #### 1. 保守成单率
-        - 取销售提供概率区间的下限值（如50%-80%取50%）
-        - 体现研发思维中的保守原则
-        
-        #### 2. 时间衰减因子
-        - 采用指数衰减模型: `e^(-λt)`
-        - `λ` = 衰减系数（行业基准0.0315）
-        - `t` = 项目交付月份与当前月份的差值（月）
-        - **理论依据**：风险随时间呈非线性累积，符合复杂系统不确定性增长规律
-        
-        #### 3. 手动纠偏
-        - 直接输入最终的纠偏后收入金额
-        - 无需计算系数，简化操作流程
-        - **应用场景**：对确定性极高的项目（如已签约）直接调整金额，对风险较大的项目进行下调
-        
-        ### 现金流计算逻辑
-        - **首付款**：交付当月支付（默认50%，可调整）
-        - **次付款**：交付次月支付（默认40%，可调整）
-        - **质保金**：交付一年后支付（默认10%，可调整）
-        - **现金流预测**：基于纠偏后收入和个性化付款比例计算
-        
-        ### 付款比例管理
-        - 每个项目可设置独立的付款比例
-        - 默认比例：50% + 40% + 10% = 100%
-        - 系统自动验证比例总和为100%
-        - 支持在项目列表中批量调整
-        
-        ### 物料支出计算逻辑
-        - **光谱设备/服务**：默认30%，可手动调整
-        - **配液设备**：默认35%，可手动调整
-        - **自动化项目**：默认40%，可手动调整
-        - **支出时间**：交付月份的前一个月
-        - **支出金额**：纠偏后收入 × 物料支出比例
-        
-        ### 人工成本管理
-        - **成本类型**：销售费用、制造费用、研发费用、管理费用等
-        - **人员/部门**：具体的人力资源分配
-        - **月度成本**：每月的人工成本
-        - **时间范围**：成本生效的时间段
-        - **自动计算**：按天数比例分配跨月成本
-        
-        ### 行政费用管理
-        - **费用类型**：房租、水电、办公用品、差旅等
-        - **费用项目**：具体的费用项目
-        - **付款频率**：月度、季度、年度
-        - **时间范围**：费用生效的时间段
-        
-        ### 偶然收支管理
-        - **偶然收入**：政府补贴、投资收益、一次性收入等
-        - **偶然支出**：罚款、维修、捐赠等一次性支出
-        - **核算方式**：计入月度现金流，影响Runway分析
-        
-        ### Runway分析
-        - **现金余额**：在系统配置中设置当前现金余额
-        - **净现金流**：月度收入 - 月度支出
-        - **Runway计算**：累计现金余额首次为负的月份
-        - **趋势图**：显示现金余额随时间的变化趋势
-        
-        
-        """)
+    # 用开关代替展开框：关闭时不输出说明内容，重跑时不再发送整段文档
+    if st.toggle("点击展开查看详细说明", key="show_model_doc"):
+        st.markdown(MODEL_DOC_MARKDOWN)
 
     st.markdown("---")
-    st.markdown("<div style='text-align: center; color: #666666; padding: 20px;'>全面预算管理系统 © 2025 | 咸数科技 · 财务小王 | 当前版本: 3.5</div>", unsafe_allow_html=True)
+    st.markdown(APP_FOOTER_HTML, unsafe_allow_html=True)
 
-    if 'first_run' not in st.session_state:
-        st.session_state.first_run = True
+    # 首次运行时提示一次，随后显式标记为非首次运行
+    if st.session_state.get('first_run', True):
+        st.session_state['first_run'] = False
         st.toast("全面预算管理系统已就绪！您可以通过手动添加或一键导入开始预算编制。", icon="✅")
 
 